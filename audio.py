@@ -0,0 +1,248 @@
+import json
+import threading
+import time
+import wave
+
+import numpy as np
+import pyaudio
+
+
+# ===== Ring buffer =====
+class AudioRing:
+    """Preallocated int16 ring buffer shared by the capture callback and readers"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.cond = threading.Condition()
+        # Absolute number of samples ever written / consumed
+        self.write_pos = 0
+        self.read_pos = 0
+        # Samples overwritten before the reader got to them
+        self.lost_samples = 0
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones when full"""
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            skipped = n - self.capacity
+            n = self.capacity
+        else:
+            skipped = 0
+
+        with self.cond:
+            start = (self.write_pos + skipped) % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[:n - first] = samples[first:]
+            self.write_pos += skipped + n
+            self.cond.notify_all()
+
+    def read(self, out, timeout=None):
+        """Fill out with the next len(out) samples.
+
+        Returns the absolute index of the first sample, or None on timeout.
+        If the reader fell more than a full buffer behind, the oldest
+        samples are skipped and counted in lost_samples.
+        """
+        count = len(out)
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.write_pos - self.read_pos >= count, timeout):
+                return None
+
+            behind = self.write_pos - self.read_pos
+            if behind > self.capacity:
+                self.lost_samples += behind - self.capacity
+                self.read_pos = self.write_pos - self.capacity
+
+            start = self.read_pos % self.capacity
+            first = min(count, self.capacity - start)
+            out[:first] = self.buffer[start:start + first]
+            out[first:] = self.buffer[:count - first]
+
+            position = self.read_pos
+            self.read_pos += count
+            return position
+
+
+# ===== Stream clock =====
+class AudioClock:
+    """Maps absolute sample indices to wall-clock time.
+
+    The sample count is the clock: two events are exactly
+    (b - a) / rate seconds apart no matter when the code that saw them
+    got scheduled. anchor() ties one sample index to the wall-clock time
+    it was captured, and to_wall() extrapolates from that single anchor.
+    The anchor is one (index, wall_time) tuple, replaced in a single
+    assignment, so a reader on another thread never pairs the index of
+    one anchor with the time of another.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.anchored = None  # (index, wall_time)
+
+    def anchor(self, index, wall_time):
+        self.anchored = (index, wall_time)
+
+    def to_wall(self, index):
+        anchored = self.anchored
+        if anchored is None:
+            return time.time()
+        anchor_index, anchor_time = anchored
+        return anchor_time + (index - anchor_index) / self.rate
+
+
+# ===== Callback-driven microphone =====
+class AudioCapture:
+    """PyAudio input stream in callback mode writing into an AudioRing.
+
+    The first callback anchors `clock` to the ADC capture time of its
+    first sample (PortAudio's input_buffer_adc_time, moved onto
+    time.time() via the callback's current_time). Drivers that report
+    no ADC time fall back to the callback time minus the buffer length.
+    After an input overflow the sample count no longer matches real
+    time, so the clock is anchored again.
+    """
+
+    def __init__(self, rate=16000, chunk=512, device_index=None, ring_seconds=4):
+        self.rate = rate
+        self.chunk = chunk
+        self.device_index = device_index
+        self.ring = AudioRing(int(rate * ring_seconds))
+        self.clock = AudioClock(rate)
+        self.overflows = 0
+        self.p = None
+        self.stream = None
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        overflow = status & pyaudio.paInputOverflow
+        if overflow:
+            self.overflows += 1
+        if overflow or self.clock.anchored is None:
+            now = time.time()
+            adc_time = time_info.get("input_buffer_adc_time", 0.0) if time_info else 0.0
+            stream_now = time_info.get("current_time", 0.0) if time_info else 0.0
+            if adc_time > 0 and stream_now > 0:
+                captured = now - (stream_now - adc_time)
+            else:
+                captured = now - frame_count / self.rate
+            # write_pos is the index the first sample of this buffer is about to get
+            self.clock.anchor(self.ring.write_pos, captured)
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return None, pyaudio.paContinue
+
+    def start(self):
+        """Open the microphone; raises if the device is not available"""
+        self.p = pyaudio.PyAudio()
+        try:
+            self.stream = self.p.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=self.rate,
+                input=True,
+                frames_per_buffer=self.chunk,
+                input_device_index=self.device_index,
+                stream_callback=self._callback
+            )
+            self.stream.start_stream()
+        except Exception:
+            self.p.terminate()
+            self.p = None
+            raise
+        return self
+
+    def stop(self):
+        """Close the stream and release PortAudio"""
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.p:
+            self.p.terminate()
+            self.p = None
+
+
+# ===== Analysis thread =====
+class ChunkWorker:
+    """Reads fixed-size chunks from a ring and hands them to a handler.
+
+    The handler is called as handler(samples, first_sample_index) on a
+    dedicated thread, so analysis runs at the audio rate regardless of
+    what the video loop is doing.
+    """
+
+    def __init__(self, ring, chunk, handler):
+        self.ring = ring
+        self.handler = handler
+        self.samples = np.zeros(chunk, dtype=np.int16)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        # Begin at the live edge instead of replaying whatever queued up
+        with self.ring.cond:
+            self.ring.read_pos = self.ring.write_pos
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            position = self.ring.read(self.samples, timeout=0.5)
+            if position is None:
+                continue
+            try:
+                self.handler(self.samples, position)
+            except Exception as e:
+                print(f"❌ Audio processing error: {e}")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+
+# ===== Recording =====
+class WavRecorder:
+    """Writes the analysed stream to a mono int16 WAV plus an event log.
+
+    write() takes the same (samples, stream_index) pairs as a ChunkWorker
+    handler; gaps from lost samples are filled with silence so positions
+    in the file match the stream. event() appends one JSON line to the
+    matching .events.jsonl (kitchen.wav -> kitchen.events.jsonl) with the
+    sample position inside the WAV; the replay harness uses those as
+    reference labels.
+    """
+
+    def __init__(self, path, rate):
+        self.path = path
+        self.rate = rate
+        self.wav = wave.open(path, "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(rate)
+        self.events = open(path.rsplit(".", 1)[0] + ".events.jsonl", "w")
+        self.first_index = None
+        self.written = 0
+
+    def write(self, samples, stream_index):
+        if self.first_index is None:
+            self.first_index = stream_index
+        gap = stream_index - self.first_index - self.written
+        if gap > 0:
+            self.wav.writeframes(np.zeros(gap, dtype=np.int16).tobytes())
+            self.written += gap
+        self.wav.writeframes(samples.astype(np.int16).tobytes())
+        self.written += len(samples)
+
+    def event(self, kind, stream_index, **fields):
+        record = {"type": kind, "sample": stream_index - (self.first_index or 0)}
+        record.update(fields)
+        self.events.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.wav.close()
+        self.events.close()
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import cv2
+
+
+# ===== Threaded camera capture =====
+class FrameGrabber:
+    """Owns the camera and keeps only the newest frame in a single slot"""
+
+    def __init__(self, source=0):
+        self.cap = cv2.VideoCapture(source)
+        # Ask V4L2 not to queue old frames behind the newest one
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.cond = threading.Condition()
+        self.frame = None
+        self.frame_time = 0
+        self.frame_id = 0
+        self.last_read_id = 0
+
+        # Frames overwritten before the main loop picked them up
+        self.dropped_frames = 0
+        # Reads that found no new frame in the slot
+        self.stale_reads = 0
+        self.captured_frames = 0
+
+        self.running = False
+        self.thread = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        """Start the capture thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        while self.running:
+            success, frame = self.cap.read()
+            if not success:
+                time.sleep(0.01)
+                continue
+
+            frame_time = time.time()
+            with self.cond:
+                if self.frame_id != self.last_read_id:
+                    self.dropped_frames += 1
+                self.frame = frame
+                self.frame_time = frame_time
+                self.frame_id += 1
+                self.captured_frames += 1
+                self.cond.notify_all()
+
+    def read(self, timeout=0.0):
+        """Return (success, frame, timestamp) for the newest unseen frame.
+
+        With timeout=0 this never blocks; otherwise it waits at most
+        timeout seconds for the capture thread to deliver a new frame.
+        """
+        with self.cond:
+            if self.frame_id == self.last_read_id and timeout > 0:
+                self.cond.wait(timeout)
+
+            if self.frame_id == self.last_read_id:
+                self.stale_reads += 1
+                return False, None, self.frame_time
+
+            self.last_read_id = self.frame_id
+            return True, self.frame, self.frame_time
+
+    def stats(self):
+        """Capture counters for logging"""
+        with self.cond:
+            return {
+                "captured": self.captured_frames,
+                "dropped": self.dropped_frames,
+                "stale_reads": self.stale_reads,
+            }
+
+    def release(self):
+        """Stop the capture thread and close the camera"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.cap.release()
+
+
+# ===== Recorded video as a camera =====
+class VideoReplay:
+    """Drop-in for FrameGrabber that plays a video file on a virtual clock.
+
+    Every frame is returned exactly once, in order, as fast as the caller
+    asks for them. The timestamp is start + frame_index / fps instead of
+    the wall clock, so hold timers and cooldowns see the same timing as
+    when the clip was recorded. fps defaults to the file's own rate.
+    """
+
+    def __init__(self, path, fps=None, start=0.0):
+        self.cap = cv2.VideoCapture(path)
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        # "Hand recognition.py" records output.avi at 15 fps
+        self.fps = fps or (file_fps if file_fps > 0 else 15.0)
+        self.start_time = start
+        self.frame_id = 0
+        self.finished = False
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        return self
+
+    def read(self, timeout=0.0):
+        """Return (success, frame, timestamp) for the next frame; success is False at the end"""
+        success, frame = self.cap.read()
+        if not success:
+            self.finished = True
+            return False, None, self.start_time + self.frame_id / self.fps
+        frame_time = self.start_time + self.frame_id / self.fps
+        self.frame_id += 1
+        return True, frame, frame_time
+
+    def stats(self):
+        return {
+            "captured": self.frame_id,
+            "dropped": 0,
+            "stale_reads": 0,
+        }
+
+    def release(self):
+        self.cap.release()
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from claps import ClapDetector, ClapPipeline, NoiseFloor, RhythmMatcher
+
+# Same rhythms as CLAP_PATTERNS in "updated final draft.py"
+PATTERNS = {
+    "double_clap": [(1.0, 1.5)],
+    "triple_clap": [(0.2, 0.7), (0.2, 0.7)],
+    "clap_pause_double": [(1.6, 2.5), (0.2, 0.7)],
+}
+
+
+class PeakDetector:
+    """The original is_clap(): one event for any chunk whose peak is over THRESHOLD"""
+
+    def __init__(self, threshold=2500):
+        self.threshold = threshold
+
+    def reset(self):
+        pass
+
+    def process(self, samples):
+        magnitude = np.abs(samples.astype(np.int32))
+        peak = int(np.argmax(magnitude))
+        if magnitude[peak] <= self.threshold:
+            return []
+        return [(peak, 20 * np.log10(magnitude[peak] / 32768))]
+
+
+DETECTORS = {
+    "peak": lambda rate: PeakDetector(),
+    "spectral": lambda rate: ClapDetector(rate),
+    "adaptive": lambda rate: ClapDetector(rate, noise_floor=NoiseFloor()),
+}
+
+
+# ===== Files =====
+def load_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected mono 16-bit PCM")
+        rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    return samples, rate
+
+
+def load_labels(path):
+    """Clap sample positions from the .events.jsonl next to a recording, or None"""
+    events_path = path.rsplit(".", 1)[0] + ".events.jsonl"
+    if not os.path.exists(events_path):
+        return None
+    with open(events_path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return np.array([e["sample"] for e in events if e["type"] == "clap"], dtype=np.int64)
+
+
+# ===== Replay =====
+def replay(samples, rate, detector, chunk=512):
+    """Run the station's clap logic over a recording on a virtual clock"""
+    pipeline = ClapPipeline(detector, RhythmMatcher(PATTERNS), lambda index: index / rate)
+    claps, patterns = [], []
+    start = time.perf_counter()
+    for pos in range(0, len(samples) - chunk + 1, chunk):
+        found, fired = pipeline.process(samples[pos:pos + chunk], pos)
+        claps += [index for index, _, _, _ in found]
+        patterns += fired
+    elapsed = time.perf_counter() - start
+    return np.array(claps, dtype=np.int64), patterns, elapsed
+
+
+def score(found, labels, tolerance):
+    """(matched, missed, extra) with each label matched at most once"""
+    used = np.zeros(len(found), dtype=bool)
+    matched = 0
+    for label in labels:
+        close = np.flatnonzero(~used & (np.abs(found - label) <= tolerance))
+        if len(close):
+            used[close[0]] = True
+            matched += 1
+    return matched, len(labels) - matched, int((~used).sum())
+
+
+# ===== Synthetic household recording =====
+def write_demo(folder, rate=16000, minutes=10, seed=0):
+    """A recording with rhythms, speech, door slams and a TV coming and going"""
+    rng = np.random.default_rng(seed)
+    n = rate * 60 * minutes
+    audio = rng.normal(0, 0.0007, n)
+    t = np.arange(int(0.3 * rate)) / rate
+
+    # TV on for the middle third
+    tv = slice(n // 3, 2 * n // 3)
+    s = np.arange(tv.stop - tv.start) / rate
+    audio[tv] += rng.normal(0, 0.03, len(s)) + 0.1 * np.sin(2 * np.pi * 210 * s) * np.sin(0.9 * s) ** 2
+
+    labels = []
+    pos = 5 * rate
+    while pos < n - 10 * rate:
+        kind = rng.choice(["double", "triple", "pause_double", "single", "speech", "door"])
+        gain = 0.6 if tv.start <= pos < tv.stop else rng.uniform(0.05, 0.5)
+        if kind in ("double", "triple", "pause_double", "single"):
+            gaps = {"double": [rng.uniform(1.1, 1.4)],
+                    "triple": [rng.uniform(0.3, 0.6), rng.uniform(0.3, 0.6)],
+                    "pause_double": [rng.uniform(1.8, 2.3), rng.uniform(0.3, 0.6)],
+                    "single": []}[kind]
+            at = pos
+            for gap in [0.0] + gaps:
+                at += int(gap * rate)
+                audio[at:at + len(t)] += rng.normal(0, gain, len(t)) * np.exp(-t / 0.01)
+                labels.append(at)
+        elif kind == "speech":
+            env = np.sin(np.pi * t / t[-1]) ** 2
+            audio[pos:pos + len(t)] += 0.2 * env * sum(np.sin(2 * np.pi * 170 * k * t) / k for k in range(1, 8))
+        else:
+            audio[pos:pos + len(t)] += 0.8 * np.sin(2 * np.pi * 80 * t) * np.exp(-t / 0.08)
+        pos += int(rng.uniform(6, 10) * rate)
+
+    path = os.path.join(folder, "demo_household.wav")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    with open(path.rsplit(".", 1)[0] + ".events.jsonl", "w") as f:
+        for at in labels:
+            # Label the peak the way the recorder would, not the burst start
+            peak = at + int(np.argmax(np.abs(audio[at:at + 256])))
+            f.write(json.dumps({"type": "clap", "sample": peak}) + "\n")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded audio through the clap logic")
+    parser.add_argument("files", nargs="*", help="mono int16 WAV files, e.g. from AUDIO_RECORD_PATH")
+    parser.add_argument("--detectors", default=",".join(DETECTORS), help="comma separated")
+    parser.add_argument("--chunk", type=int, default=512)
+    parser.add_argument("--tolerance", type=float, default=30.0, help="label match window, ms")
+    parser.add_argument("--demo", action="store_true", help="replay a generated 10 minute recording")
+    args = parser.parse_args()
+
+    files = list(args.files)
+    demo_dir = None
+    if args.demo:
+        demo_dir = tempfile.TemporaryDirectory()
+        files.append(write_demo(demo_dir.name))
+    if not files:
+        parser.error("give WAV files or --demo")
+
+    totals = {}
+    for path in files:
+        samples, rate = load_wav(path)
+        labels = load_labels(path)
+        duration = len(samples) / rate
+        print(f"\n🎧 {os.path.basename(path)}: {duration / 60:.1f} min"
+              + (f", {len(labels)} labelled claps" if labels is not None else ", no labels"))
+
+        for name in args.detectors.split(","):
+            found, patterns, elapsed = replay(samples, rate, DETECTORS[name](rate), args.chunk)
+            total = totals.setdefault(name, [0, 0, 0, 0.0, 0.0])
+            total[3] += duration
+            total[4] += elapsed
+            line = f"   {name:>9}: {len(found):4d} claps, {len(patterns):3d} patterns"
+            if labels is not None:
+                matched, missed, extra = score(found, labels, int(args.tolerance / 1000 * rate))
+                total[0] += matched
+                total[1] += missed
+                total[2] += extra
+                line += f", recall {matched / max(1, len(labels)):6.1%}, {extra:3d} extra"
+            line += f", x{duration / elapsed:.0f} real time"
+            print(line)
+            counts = {}
+            for pattern, _ in patterns:
+                counts[pattern] = counts.get(pattern, 0) + 1
+            if counts:
+                print(f"              {counts}")
+
+    print("\n📊 Totals")
+    for name, (matched, missed, extra, duration, elapsed) in totals.items():
+        labelled = matched + missed
+        recall = f"recall {matched / labelled:6.1%}, {extra} extra, " if labelled else ""
+        print(f"   {name:>9}: {recall}{duration / 60:.1f} min of audio in {elapsed:.2f} s "
+              f"(x{duration / elapsed:.0f} real time)")
+
+    if demo_dir is not None:
+        demo_dir.cleanup()
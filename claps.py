@@ -0,0 +1,412 @@
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+
+# ===== Adaptive noise floor =====
+class NoiseFloor:
+    """Streaming estimate of the background level in dBFS.
+
+    An asymmetric EMA: it falls quickly (fall_time) when the room gets
+    quieter and rises slowly (rise_time) when it gets louder, so it
+    follows a low percentile of the chunk levels and short sounds like
+    claps hardly move it. update() is O(1) per chunk. The clap trigger
+    sits margin_db above the floor and never below min_threshold_db.
+    """
+
+    def __init__(self, margin_db=12.0, rise_time=3.0, fall_time=0.5, initial_db=-60.0,
+                 min_db=-90.0, min_threshold_db=-55.0):
+        self.margin_db = margin_db
+        self.rise_time = rise_time
+        self.fall_time = fall_time
+        self.floor_db = initial_db
+        self.min_db = min_db
+        self.min_threshold_db = min_threshold_db
+
+    @property
+    def threshold_db(self):
+        return max(self.min_threshold_db, self.floor_db + self.margin_db)
+
+    def update(self, level_db, seconds):
+        """Feed the level of one chunk lasting `seconds`; returns the new threshold"""
+        tau = self.fall_time if level_db < self.floor_db else self.rise_time
+        alpha = min(1.0, seconds / tau)
+        self.floor_db = max(self.min_db, self.floor_db + alpha * (level_db - self.floor_db))
+        return self.threshold_db
+
+
+# ===== Spectral onset clap detector =====
+class ClapDetector:
+    """Finds hand claps in a stream of int16 chunks.
+
+    Chunks are cut into overlapping Hann-windowed frames (frame samples,
+    advancing by hop) and all frames of a chunk go through one rfft call.
+    A frame is a clap onset when it is loud enough (RMS over
+    threshold_db dBFS), most of its spectrum is new compared with the
+    previous frame (normalised spectral flux over min_flux, which rules
+    out speech and music that build up gradually) and enough of its
+    energy sits above high_cutoff Hz (which rules out door slams and
+    thuds). After an onset nothing fires for `refractory` seconds, so a
+    clap that straddles two chunks is still reported once. With a
+    NoiseFloor, threshold_db follows the background level instead of
+    staying fixed.
+
+    process() returns [(peak_offset, level_db), ...], where peak_offset
+    is the position of the loudest sample relative to the first sample
+    of the chunk passed in (slightly negative if it fell in the tail of
+    the previous chunk). Chunks must be contiguous; call reset() after
+    a gap.
+    """
+
+    def __init__(self, rate=16000, frame=256, hop=128, threshold_db=-35.0, min_flux=0.6,
+                 high_cutoff=2000.0, min_high_ratio=0.25, refractory=0.12, noise_floor=None):
+        self.rate = rate
+        self.noise_floor = noise_floor
+        self.frame = frame
+        self.hop = hop
+        self.threshold_db = threshold_db
+        self.min_flux = min_flux
+        self.min_high_ratio = min_high_ratio
+        self.refractory = int(refractory * rate)
+
+        self.window = np.hanning(frame).astype(np.float32)
+        self.high_bins = np.fft.rfftfreq(frame, 1.0 / rate) >= high_cutoff
+        self.reset()
+
+    def reset(self):
+        self.tail = np.zeros(0, dtype=np.float32)  # samples not yet covered by a full frame
+        self.tail_start = 0  # stream index of tail[0]
+        self.stream_pos = 0  # stream index of the next chunk
+        self.prev_mag = None
+        self.last_onset = -self.refractory - 1
+
+    def process(self, samples):
+        chunk_start = self.stream_pos
+        self.stream_pos += len(samples)
+        buf = np.concatenate((self.tail, samples.astype(np.float32) / 32768.0))
+        buf_start = self.tail_start
+
+        n_frames = (len(buf) - self.frame) // self.hop + 1
+        if n_frames <= 0:
+            self.tail = buf
+            return []
+
+        frames = np.lib.stride_tricks.sliding_window_view(buf, self.frame)[::self.hop][:n_frames]
+        self.tail = buf[n_frames * self.hop:]
+        self.tail_start = buf_start + n_frames * self.hop
+
+        power = np.mean(frames * frames, axis=1)
+        level_db = 10 * np.log10(power + 1e-12)
+        if self.noise_floor is not None:
+            # Judge this chunk against the floor from before it, then let the floor see it
+            self.threshold_db = self.noise_floor.threshold_db
+            # Quietest frame of the chunk, so a clap inside it does not lift the floor
+            self.noise_floor.update(float(level_db.min()), len(samples) / self.rate)
+
+        mag = np.abs(np.fft.rfft(frames * self.window, axis=1))
+        prev = np.vstack((mag[:1] if self.prev_mag is None else self.prev_mag, mag[:-1]))
+        self.prev_mag = mag[-1:]
+        flux = np.maximum(mag - prev, 0).sum(axis=1) / (mag.sum(axis=1) + 1e-9)
+
+        spectrum = mag * mag
+        high_ratio = spectrum[:, self.high_bins].sum(axis=1) / (spectrum.sum(axis=1) + 1e-12)
+
+        onsets = np.flatnonzero((level_db > self.threshold_db)
+                                & (flux > self.min_flux)
+                                & (high_ratio > self.min_high_ratio))
+        events = []
+        for i in onsets:
+            start = buf_start + int(i) * self.hop
+            if start - self.last_onset <= self.refractory:
+                continue
+            self.last_onset = start
+            # The transient peak can land in the next frame, so look one hop further
+            local = int(i) * self.hop
+            segment = buf[local:local + self.frame + self.hop]
+            peak = start + int(np.argmax(np.abs(segment)))
+            events.append((peak - chunk_start, float(level_db[i])))
+        return events
+
+
+# ===== Clap rhythm patterns =====
+class RhythmMatcher:
+    """Matches clap onsets against several declarative rhythms at once.
+
+    A pattern is a list of (min_gap, max_gap) windows in seconds between
+    consecutive claps, e.g. {"double_clap": [(1.0, 1.5)],
+    "triple_clap": [(0.2, 0.7), (0.2, 0.7)]}. The patterns are merged
+    into a trie and compiled up front into a DFA over gap bands (the
+    window edges split the time axis into bands), so onset() costs one
+    bisect and one table lookup however many patterns there are.
+
+    When a completed pattern is also the start of a longer one, it is
+    held back until the longer one can no longer continue; poll() fires
+    it then, and also forgets a half-finished rhythm once no window can
+    be met any more. onset() and poll() return the names of the patterns
+    that fired.
+    """
+
+    def __init__(self, patterns):
+        self.names = list(patterns)
+
+        # Trie: node 0 means "one clap heard"
+        children = [[]]
+        accepts = [None]
+        depth = [1]
+        for name in self.names:
+            node = 0
+            for lo, hi in patterns[name]:
+                for c_lo, c_hi, child in children[node]:
+                    if (c_lo, c_hi) == (lo, hi):
+                        node = child
+                        break
+                else:
+                    children.append([])
+                    accepts.append(None)
+                    depth.append(depth[node] + 1)
+                    children[node].append((lo, hi, len(children) - 1))
+                    node = len(children) - 1
+            if accepts[node] is None:
+                accepts[node] = name
+
+        # Band k covers [edges[k - 1], edges[k]); max_gap is inclusive
+        edges = sorted({lo for c in children for lo, _, _ in c}
+                       | {math.nextafter(hi, math.inf) for c in children for _, hi, _ in c})
+        self.edges = edges
+        band_left = [-math.inf] + edges
+
+        # Subset construction; DFA state 0 is "no claps yet". Where a state
+        # completes several patterns, the longest one wins, then the earliest declared.
+        order = {name: i for i, name in enumerate(self.names)}
+        states = [frozenset()]
+        index = {states[0]: 0}
+        self.table = []
+        self.continues = []
+        self.accept = []
+        self.hold = []
+        self.horizon = []
+        self.depth = []
+        pos = 0
+        while pos < len(states):
+            nodes = states[pos]
+            done = sorted((n for n in nodes if accepts[n] is not None),
+                          key=lambda n: (-depth[n], order[accepts[n]]))
+            winner = done[0] if done else None
+            self.accept.append(accepts[winner] if done else None)
+            self.hold.append(max((hi for _, hi, _ in children[winner]), default=None) if done else None)
+            self.horizon.append(max((hi for n in nodes for _, hi, _ in children[n]), default=None))
+            self.depth.append(max((depth[n] for n in nodes), default=0))
+
+            row, cont = [], []
+            for left in band_left:
+                nxt = {0}
+                extends = False
+                for n in nodes:
+                    for lo, hi, child in children[n]:
+                        if lo <= left <= hi:
+                            nxt.add(child)
+                            extends = extends or n == winner
+                nxt = frozenset(nxt)
+                if nxt not in index:
+                    index[nxt] = len(states)
+                    states.append(nxt)
+                row.append(index[nxt])
+                cont.append(extends)
+            self.table.append(row)
+            self.continues.append(cont)
+            pos += 1
+
+        self.reset()
+
+    def reset(self):
+        self.state = 0
+        self.last = None
+        self.pending = None  # (pattern, deadline)
+
+    @property
+    def progress(self):
+        """Claps in the longest rhythm currently in progress"""
+        return self.depth[self.state]
+
+    def onset(self, t):
+        fired = self.poll(t)
+        band = bisect_right(self.edges, t - self.last) if self.last is not None else 0
+        extends = self.continues[self.state][band]
+        self.state = self.table[self.state][band]
+        self.last = t
+
+        if self.pending is not None:
+            if not extends:
+                # Gap too short for the longer pattern: the shorter one stands
+                fired.append(self.pending[0])
+                self.state = self.table[0][0]
+            self.pending = None
+
+        name = self.accept[self.state]
+        if name is not None:
+            if self.hold[self.state] is None:
+                fired.append(name)
+                self.state = 0
+            else:
+                self.pending = (name, t + self.hold[self.state])
+        return fired
+
+    def poll(self, t):
+        """Call regularly; fires held-back patterns and drops stale rhythms"""
+        fired = []
+        if self.pending is not None and t > self.pending[1]:
+            fired.append(self.pending[0])
+            self.state = 0
+            self.pending = None
+        if self.last is not None and (self.horizon[self.state] is None
+                                      or t - self.last > self.horizon[self.state]):
+            self.state = 0
+        return fired
+
+
+# ===== Detection and rhythm over a sample stream =====
+class ClapPipeline:
+    """ClapDetector plus RhythmMatcher, driven by stream sample indices.
+
+    The station and the replay harness both go through this class, so a
+    recording is judged by exactly the same logic as the live microphone.
+    to_time(sample_index) turns the stream clock into seconds: the
+    microphone's AudioClock.to_wall live, or index / rate as a virtual
+    clock in replay. process() returns (claps, patterns), with claps as
+    [(sample_index, time, level_db, gap)] where gap is the time since the
+    previous clap (None for the first), and patterns as [(name, time)].
+    """
+
+    def __init__(self, detector, rhythm, to_time):
+        self.detector = detector
+        self.rhythm = rhythm
+        self.to_time = to_time
+        self.next_index = None
+
+    def process(self, samples, sample_index):
+        if sample_index != self.next_index:
+            # Samples were lost in between, the detector's frame overlap no longer lines up
+            self.detector.reset()
+        self.next_index = sample_index + len(samples)
+
+        claps, patterns = [], []
+        for peak_offset, level_db in self.detector.process(samples):
+            # Timestamp of the clap peak itself, taken from the sample count
+            index = sample_index + peak_offset
+            t = self.to_time(index)
+            gap = t - self.rhythm.last if self.rhythm.last is not None else None
+            claps.append((index, t, level_db, gap))
+            patterns += [(name, t) for name in self.rhythm.onset(t)]
+
+        # Patterns held back for a longer rhythm fire once it can no longer continue
+        now = self.to_time(self.next_index)
+        patterns += [(name, now) for name in self.rhythm.poll(now)]
+        return claps, patterns
+
+
+# ===== Synthetic checks =====
+if __name__ == "__main__":
+    import time
+
+    rate = 16000
+    rng = np.random.default_rng(1)
+    t = np.arange(int(0.3 * rate)) / rate
+
+    def clap(gain=0.5):
+        return rng.normal(0, gain, len(t)) * np.exp(-t / 0.01)
+
+    def door_slam():
+        return 0.8 * np.sin(2 * np.pi * 90 * t) * np.exp(-t / 0.08)
+
+    def speech():
+        env = np.clip(np.sin(np.pi * t / t[-1]), 0, None) ** 2
+        voiced = sum(np.sin(2 * np.pi * 180 * k * t) / k for k in range(1, 8))
+        return 0.2 * env * voiced
+
+    def run(detector, pcm):
+        found = []
+        for pos in range(0, len(pcm) - 511, 512):
+            for offset, level in detector.process(pcm[pos:pos + 512]):
+                found.append(pos + offset)
+        return found
+
+    def to_pcm(audio):
+        return (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+
+    # Claps vs other sounds
+    sounds = [("clap", clap), ("door slam", door_slam), ("speech", speech),
+              ("clap", clap), ("clap", clap)]
+    audio = rng.normal(0, 0.002, rate * (len(sounds) + 1))
+    expected = []
+    for k, (name, make) in enumerate(sounds):
+        at = rate // 2 + k * rate + int(rng.integers(0, 512))
+        audio[at:at + len(t)] += make()
+        if name == "clap":
+            expected.append(at)
+    pcm = to_pcm(audio)
+
+    start = time.perf_counter()
+    found = run(ClapDetector(rate), pcm)
+    elapsed = time.perf_counter() - start
+    print(f"👏 Expected claps at {expected}")
+    print(f"🎯 Detected at      {found}")
+    print(f"⏱ {elapsed / (len(pcm) // 512) * 1000:.3f} ms per 32 ms chunk "
+          f"({elapsed / (len(pcm) / rate) * 100:.2f}% of real time)")
+
+    # Stepped background: quiet bedroom with soft claps, then a TV (switched on at 20 s)
+    # with loud claps, then quiet again
+    segments = [("bedroom", 0.0005, 0.03, 20), ("tv", 0.05, 0.8, 20), ("bedroom", 0.0005, 0.03, 20)]
+    audio, expected = [], []
+    offset = 0
+    for name, noise, gain, seconds in segments:
+        n = rate * seconds
+        part = rng.normal(0, noise, n)
+        # TV: broadband noise, a speech-like hum that comes and goes and quieter on-screen bangs
+        if name == "tv":
+            s = np.arange(n) / rate
+            part += 0.15 * np.sin(2 * np.pi * 220 * s) * np.sin(2 * np.pi * 0.35 * s) ** 2
+            for at in range(4 * rate, n - rate, 2 * rate):
+                part[at:at + len(t)] += clap(0.2)
+        for at in range(3 * rate, n - rate, 2 * rate):
+            part[at:at + len(t)] += clap(gain)
+            expected.append(offset + at)
+        audio.append(part)
+        offset += n
+    pcm = to_pcm(np.concatenate(audio))
+
+    floor = NoiseFloor()
+    for label, detector in (("fixed -35 dBFS", ClapDetector(rate)),
+                            ("adaptive", ClapDetector(rate, noise_floor=floor))):
+        found = np.array(run(detector, pcm))
+        hits = sum(np.any(np.abs(found - at) < 400) for at in expected) if len(found) else 0
+        false = [f / rate for f in found if not np.any(np.abs(np.array(expected) - f) < 400)]
+        print(f"🎚️ {label}: {hits}/{len(expected)} claps, {len(false)} false triggers "
+              f"(at {', '.join(f'{f:.1f}' for f in false)} s)")
+    print(f"📉 Final floor {floor.floor_db:.1f} dBFS, margin {floor.margin_db:.0f} dB, "
+          f"threshold {floor.threshold_db:.1f} dBFS")
+
+    # Rhythms: onset times in seconds -> patterns fired
+    matcher = RhythmMatcher({
+        "double_clap": [(1.0, 1.5)],
+        "triple_clap": [(0.2, 0.7), (0.2, 0.7)],
+        "clap_pause_double": [(1.6, 2.5), (0.2, 0.7)],
+        "four_clap": [(0.2, 0.7), (0.2, 0.7), (0.2, 0.7)],
+    })
+    onsets = [0.0, 1.2,             # double
+              10.0, 10.4, 10.8,     # triple (held back until four_clap cannot continue)
+              20.0, 22.0, 22.5,     # clap, pause, clap clap
+              30.0, 30.4, 30.8, 31.2,  # four
+              40.0, 40.9]           # no pattern
+    start = time.perf_counter()
+    fired = []
+    clock = 0.0
+    for t_onset in onsets + [50.0]:
+        while clock < t_onset:
+            fired += [(round(clock, 2), name) for name in matcher.poll(clock)]
+            clock += 0.032
+        fired += [(t_onset, name) for name in matcher.onset(t_onset)]
+    elapsed = time.perf_counter() - start
+    print(f"🥁 {len(matcher.table)} DFA states, {len(matcher.edges) + 1} gap bands")
+    print(f"🥁 Fired: {fired}")
+    print(f"⏱ {elapsed / (clock / 0.032) * 1e6:.1f} µs per chunk including onsets")
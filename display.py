@@ -0,0 +1,142 @@
+import threading
+import time
+
+# Same DDRAM addresses as rpi_lcd.LINES, indexed from row 0
+ROW_ADDRESS = (0x80, 0xC0, 0x94, 0xD4)
+
+PRIORITY_ALERT = 0
+PRIORITY_LOG = 1
+
+
+class LcdRenderer:
+    """Owns the character LCD; everything else only posts messages.
+
+    post() never touches I2C. Pending messages are kept one per
+    priority, so a newer message replaces an older one of the same
+    priority that has not been shown yet. The renderer thread shows the
+    most urgent message, never switches faster than min_interval, keeps
+    a message up for `hold` seconds and then goes back to the idle lines
+    from set_idle(). A message only gives way early to one of the same
+    or higher priority. Only characters that differ from what is already
+    on the display are written.
+    """
+
+    def __init__(self, lcd, width=16, rows=2, min_interval=0.3, hold=8.0):
+        self.lcd = lcd
+        self.width = width
+        self.rows = rows
+        self.min_interval = min_interval
+        self.hold = hold
+
+        self.cond = threading.Condition()
+        self.pending = {}  # priority -> (lines, hold)
+        self.message = None  # (priority, until, lines) currently on screen
+        self.idle = self._fit(())
+        self.shown = [" " * width] * rows  # LCD() starts with a cleared display
+
+        self.posted = 0
+        self.coalesced = 0
+        self.updates = 0
+        self.chars_written = 0
+
+        self.running = False
+        self.thread = None
+
+    def _fit(self, lines):
+        lines = list(lines)[:self.rows]
+        lines += [""] * (self.rows - len(lines))
+        return [line[:self.width].ljust(self.width) for line in lines]
+
+    def post(self, line1, line2="", priority=PRIORITY_LOG, hold=None):
+        """Queue a message for display; returns immediately"""
+        with self.cond:
+            self.posted += 1
+            if priority in self.pending:
+                self.coalesced += 1
+            self.pending[priority] = (self._fit((line1, line2)), self.hold if hold is None else hold)
+            self.cond.notify()
+
+    def set_idle(self, line1, line2=""):
+        """Lines shown whenever no message is up, e.g. temperature"""
+        with self.cond:
+            self.idle = self._fit((line1, line2))
+            self.cond.notify()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._render_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _render_loop(self):
+        last_switch = 0.0
+        while self.running:
+            with self.cond:
+                now = time.monotonic()
+                if self.message is not None and now >= self.message[1]:
+                    self.message = None
+
+                wake_at = now + 1.0
+                if self.pending:
+                    priority = min(self.pending)
+                    if self.message is None or priority <= self.message[0]:
+                        if now - last_switch >= self.min_interval:
+                            lines, hold = self.pending.pop(priority)
+                            self.message = (priority, now + hold, lines)
+                            last_switch = now
+                        else:
+                            wake_at = last_switch + self.min_interval
+                if self.message is not None:
+                    wake_at = min(wake_at, self.message[1])
+                lines = self.message[2] if self.message is not None else self.idle
+
+            self._draw(lines)
+
+            with self.cond:
+                if self.running:
+                    self.cond.wait(max(0.0, wake_at - time.monotonic()))
+
+    def _draw(self, lines):
+        if lines == self.shown:
+            return
+        self.updates += 1
+        for row, (old, new) in enumerate(zip(self.shown, lines)):
+            if old == new:
+                continue
+            try:
+                cursor = None
+                for col, (a, b) in enumerate(zip(old, new)):
+                    if a == b:
+                        continue
+                    if cursor != col:
+                        self.lcd.write(ROW_ADDRESS[row] + col)
+                    self.lcd.write(ord(b), mode=1)
+                    cursor = col + 1
+                    self.chars_written += 1
+                self.shown[row] = new
+            except Exception as e:
+                print(f"❌ LCD write error: {e}")
+                # Unknown state on the glass, rewrite the whole row next time
+                self.shown[row] = "\0" * self.width
+
+    def stats(self):
+        return {
+            "posted": self.posted,
+            "coalesced": self.coalesced,
+            "updates": self.updates,
+            "chars_written": self.chars_written,
+            # What rewriting both full lines on every update would have cost
+            "chars_full": self.updates * self.width * self.rows,
+        }
+
+    def stop(self, clear=True):
+        self.running = False
+        with self.cond:
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        if clear:
+            try:
+                self.lcd.clear()
+            except Exception as e:
+                print(f"❌ LCD clear error: {e}")
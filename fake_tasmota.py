@@ -0,0 +1,378 @@
+import argparse
+import json
+import queue
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from mqtt_control import CommandPipeline, ConnectionManager, DeviceRegistry
+
+
+# ===== Minimal MQTT 3.1.1 broker =====
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def topic_matches(pattern, topic):
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+class _BrokerHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.send_lock = threading.Lock()
+        self.subscriptions = set()
+        # Without this, Nagle plus delayed ACKs add ~40 ms to small replies
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.broker.add_client(self)
+
+    def finish(self):
+        self.server.broker.remove_client(self)
+
+    def send(self, data):
+        with self.send_lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                pass
+
+    def _read_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def handle(self):
+        try:
+            while True:
+                header = self._read_exact(1)[0]
+                length, shift = 0, 0
+                while True:
+                    byte = self._read_exact(1)[0]
+                    length += (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = self._read_exact(length) if length else b""
+                if not self._dispatch(header >> 4, header & 0x0F, body):
+                    return
+        except (ConnectionError, OSError):
+            return
+
+    def _dispatch(self, kind, flags, body):
+        if kind == 1:  # CONNECT
+            self.send(b"\x20\x02\x00\x00")
+        elif kind == 3:  # PUBLISH
+            qos = (flags >> 1) & 3
+            topic_len = struct.unpack("!H", body[:2])[0]
+            topic = body[2:2 + topic_len].decode()
+            pos = 2 + topic_len
+            if qos:
+                packet_id = body[pos:pos + 2]
+                pos += 2
+                self.send(b"\x40\x02" + packet_id)
+            self.server.broker.route(topic, body[pos:])
+        elif kind == 8:  # SUBSCRIBE
+            packet_id, pos, granted = body[:2], 2, b""
+            while pos < len(body):
+                n = struct.unpack("!H", body[pos:pos + 2])[0]
+                self.subscriptions.add(body[pos + 2:pos + 2 + n].decode())
+                pos += 3 + n
+                granted += b"\x00"
+            self.send(b"\x90" + encode_length(2 + len(granted)) + packet_id + granted)
+        elif kind == 10:  # UNSUBSCRIBE
+            self.send(b"\xb0\x02" + body[:2])
+        elif kind == 12:  # PINGREQ
+            self.send(b"\xd0\x00")
+        elif kind == 14:  # DISCONNECT
+            return False
+        return True
+
+
+class FakeBroker:
+    """Just enough of an MQTT broker for local benchmarks.
+
+    Handles CONNECT, PUBLISH (QoS 0/1, delivered to subscribers at QoS
+    0), SUBSCRIBE with + and # wildcards, PING and DISCONNECT. stop()
+    drops every client, so it can stand in for a Mosquitto restart.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), _BrokerHandler)
+        self.server.daemon_threads = True
+        self.server.broker = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def add_client(self, handler):
+        with self.lock:
+            self.clients.add(handler)
+
+    def remove_client(self, handler):
+        with self.lock:
+            self.clients.discard(handler)
+
+    def route(self, topic, payload):
+        encoded = topic.encode()
+        body = struct.pack("!H", len(encoded)) + encoded + payload
+        packet = b"\x30" + encode_length(len(body)) + body
+        with self.lock:
+            targets = [c for c in self.clients
+                       if any(topic_matches(s, topic) for s in c.subscriptions)]
+        for client in targets:
+            client.send(packet)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# ===== Simulated Tasmota device =====
+class FakeTasmota:
+    """Behaves like a Tasmota relay on cmnd/<topic>/POWER<n> and Backlog.
+
+    Replies on stat/<topic>/RESULT and stat/<topic>/POWER<n> the way the
+    firmware does; single-relay devices use the plain POWER key. `delay`
+    holds each command back that long before it is handled, on a worker
+    thread so paho's network loop keeps acking and pinging meanwhile;
+    commands stay in order but are not serialised behind each other's
+    delay. `loss` drops that fraction of incoming commands without any
+    reply.
+    """
+
+    def __init__(self, topic, port, host="127.0.0.1", channels=1, delay=0.0, loss=0.0):
+        self.topic = topic
+        self.channels = channels
+        self.delay = delay
+        self.loss = loss
+        self.power = [False] * channels
+        self.received = 0
+        self.dropped = 0
+        self.host = host
+        self.port = port
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.delayed = queue.Queue()  # (due, topic, payload), None to stop
+        self.thread = None
+
+    def start(self):
+        if self.delay:
+            self.thread = threading.Thread(target=self._delay_loop, daemon=True)
+            self.thread.start()
+        self.client.connect(self.host, self.port, 60)
+        self.client.loop_start()
+        return self
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # RESULT and POWER go out back to back; keep Nagle from holding the second one
+        client.socket().setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.subscribe(f"cmnd/{self.topic}/+")
+
+    def _on_message(self, client, userdata, message):
+        self.received += 1
+        if random.random() < self.loss:
+            self.dropped += 1
+            return
+        if self.delay:
+            self.delayed.put((time.monotonic() + self.delay, message.topic, message.payload))
+        else:
+            self._handle(message.topic, message.payload)
+
+    def _delay_loop(self):
+        while True:
+            item = self.delayed.get()
+            if item is None:
+                return
+            due, topic, payload = item
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._handle(topic, payload)
+
+    def _handle(self, topic, payload):
+        command = topic.rsplit("/", 1)[1].upper()
+        payload = payload.decode().strip()
+        if command == "BACKLOG":
+            steps = [step.strip().split(None, 1) for step in payload.split(";") if step.strip()]
+        else:
+            steps = [(command, payload)]
+
+        for name, *value in steps:
+            self._power(name.upper(), value[0].upper() if value else "")
+
+    def _power(self, name, value):
+        if not name.startswith("POWER"):
+            return
+        channel = int(name[5:] or 1)
+        if not 1 <= channel <= self.channels:
+            return
+
+        i = channel - 1
+        if value in ("ON", "1"):
+            self.power[i] = True
+        elif value in ("OFF", "0"):
+            self.power[i] = False
+        elif value in ("TOGGLE", "2"):
+            self.power[i] = not self.power[i]
+
+        key = "POWER" if self.channels == 1 else f"POWER{channel}"
+        state = "ON" if self.power[i] else "OFF"
+        self.client.publish(f"stat/{self.topic}/RESULT", json.dumps({key: state}))
+        self.client.publish(f"stat/{self.topic}/{key}", state)
+
+    def stop(self):
+        if self.thread is not None:
+            self.delayed.put(None)
+            self.thread.join(timeout=1.0)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+# ===== End-to-end latency benchmark =====
+def run_benchmark(devices=8, count=2000, rate=500.0, delay=0.0, loss=0.0, window=0.0, timeout=1.0):
+    """Drive DeviceRegistry -> CommandPipeline -> broker -> fake devices and back.
+
+    Each device has at most one command in flight, so every
+    stat/<topic>/RESULT can be matched to the command that caused it.
+    Commands without a reply within `timeout` count as lost.
+    """
+    broker = FakeBroker().start()
+    names = [f"bench_{i:02d}" for i in range(devices)]
+    fakes = [FakeTasmota(name, broker.port, delay=delay, loss=loss).start() for name in names]
+
+    lock = threading.Condition()
+    sent_at = {}
+    latencies = []
+    lost = 0
+
+    def on_result(client, userdata, message):
+        now = time.perf_counter()
+        name = message.topic.split("/")[1]
+        with lock:
+            start = sent_at.pop(name, None)
+            if start is not None:
+                latencies.append(now - start)
+                lock.notify()
+
+    monitor = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    monitor.on_message = on_result
+    monitor.connect("127.0.0.1", broker.port, 60)
+    monitor.subscribe("stat/+/RESULT")
+    monitor.loop_start()
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    pipeline = CommandPipeline(client, window=window).start()
+    link = ConnectionManager(client, "127.0.0.1", broker.port, listeners=[pipeline.set_connected]).start()
+    registry = DeviceRegistry({name: [(name, 1, "TOGGLE")] for name in names})
+
+    deadline = time.monotonic() + 5
+    while not link.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)  # let the devices and the monitor finish subscribing
+
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    next_send = start
+    for i in range(count):
+        name = names[i % devices]
+        with lock:
+            # Wait for this device's previous command, or give up on it
+            if name in sent_at:
+                lock.wait_for(lambda: name not in sent_at,
+                              timeout=max(0.0, sent_at[name] + timeout - time.perf_counter()))
+                if sent_at.pop(name, None) is not None:
+                    lost += 1
+        now = time.perf_counter()
+        if now < next_send:
+            time.sleep(next_send - now)
+        next_send += interval
+
+        with lock:
+            sent_at[name] = time.perf_counter()
+        registry.run(name, pipeline)
+
+    with lock:
+        lock.wait_for(lambda: not sent_at, timeout=timeout)
+        lost += len(sent_at)
+    elapsed = time.perf_counter() - start
+
+    link.stop()
+    pipeline.stop()
+    monitor.disconnect()
+    monitor.loop_stop()
+    for fake in fakes:
+        fake.stop()
+    broker.stop()
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "sent": count,
+        "completed": len(latencies),
+        "lost": lost,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "throughput": len(latencies) / elapsed,
+        "pipeline": pipeline.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gesture action -> Tasmota relay latency benchmark")
+    parser.add_argument("--devices", type=int, default=8)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500.0, help="commands per second")
+    parser.add_argument("--delay", type=float, default=0.0, help="delay before a device handles a command, s")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of commands dropped")
+    parser.add_argument("--window", type=float, default=0.0, help="pipeline coalescing window, s")
+    parser.add_argument("--timeout", type=float, default=1.0, help="reply timeout before a command counts as lost, s")
+    args = parser.parse_args()
+
+    print(f"🧪 {args.count} commands to {args.devices} fake devices at {args.rate:.0f}/s "
+          f"(delay {args.delay * 1000:.0f} ms, loss {args.loss:.0%}, window {args.window * 1000:.0f} ms)")
+    result = run_benchmark(args.devices, args.count, args.rate, args.delay, args.loss, args.window,
+                           args.timeout)
+    print(f"✅ {result['completed']}/{result['sent']} round trips, {result['lost']} lost")
+    print(f"⏱ RTT p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms")
+    print(f"🚀 Throughput {result['throughput']:.0f} commands/s, "
+          f"PUBACK p50 {result['pipeline']['ack_p50_ms']:.2f} ms")
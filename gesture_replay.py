@@ -0,0 +1,307 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from camera import VideoReplay
+from gestures import GesturePipeline
+from inference import RoiHands
+from landmarks import LandmarkWriter, load_landmarks
+
+# Same settings as "updated final draft.py"
+MAX_HANDS = 2
+MAX_DISTANCE = 24
+HOLD_TIME_NEEDED = 2
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov")
+DUMP_EXTENSION = ".landmarks"
+
+
+# ===== Files =====
+def find_clips(paths):
+    """Videos and landmark dumps from the arguments; folders are searched one level deep.
+
+    A dump written with --dump shares its video's .expected.json, so
+    replaying both checks that the dump reproduces the video's events.
+    """
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            clips += sorted(p for p in glob.glob(os.path.join(path, "*"))
+                            if p.lower().endswith(VIDEO_EXTENSIONS + (DUMP_EXTENSION,)))
+        else:
+            clips.append(path)
+    return clips
+
+
+def expected_path(clip):
+    return clip.rsplit(".", 1)[0] + ".expected.json"
+
+
+def load_expected(clip):
+    """[(time, event)] stored next to a clip with --update, or None"""
+    path = expected_path(clip)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return [(e["time"], e["event"]) for e in json.load(f)["events"]]
+
+
+def save_expected(clip, events, fps):
+    with open(expected_path(clip), "w") as f:
+        json.dump({"fps": fps, "events": [{"time": round(t, 3), "event": event} for t, event, _ in events]},
+                  f, indent=1)
+
+
+# ===== Replay =====
+def replay(clip, complexity=1, use_roi=True, flip=False, fps=None, dump=None):
+    """Run a clip through MediaPipe and the station's gesture logic on a virtual clock.
+
+    Returns (events, timings) where events is a list of
+    (time, event, hand_id) and timings holds the frame count and the
+    seconds spent decoding, in MediaPipe and in the gesture logic.
+    With dump set, every frame's landmarks are also written there for
+    landmarks.py.
+    """
+    # Only video needs MediaPipe; landmark dumps replay without it
+    import mediapipe as mp
+
+    source = VideoReplay(clip, fps=fps)
+    if not source.isOpened():
+        raise IOError(f"{clip}: cannot open")
+
+    hands = mp.solutions.hands.Hands(
+        max_num_hands=MAX_HANDS, model_complexity=complexity, min_detection_confidence=0.9)
+    detector = RoiHands(hands) if use_roi else hands
+    pipeline = GesturePipeline(MAX_HANDS, MAX_DISTANCE, HOLD_TIME_NEEDED)
+    writer = LandmarkWriter(dump, MAX_HANDS, source.fps) if dump else None
+
+    events = []
+    timings = {"frames": 0, "decode": 0.0, "inference": 0.0, "gestures": 0.0}
+    try:
+        while True:
+            start = time.perf_counter()
+            success, frame, frame_time = source.read()
+            if not success:
+                break
+            # output.avi from "Hand recognition.py" is already mirrored
+            if flip:
+                frame = cv2.flip(frame, 1)
+            h, w, _ = frame.shape
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            decoded = time.perf_counter()
+
+            results = detector.process(rgb)
+            inferred = time.perf_counter()
+
+            found, _, _ = pipeline.step(results.multi_hand_landmarks or [], w, h, frame_time)
+            events += [(frame_time, event, hand_id) for event, hand_id in found]
+            done = time.perf_counter()
+            if writer is not None:
+                writer.write(frame_time, results, w, h)
+
+            timings["frames"] += 1
+            timings["decode"] += decoded - start
+            timings["inference"] += inferred - decoded
+            timings["gestures"] += done - inferred
+    finally:
+        source.release()
+        hands.close()
+        if writer is not None:
+            writer.close()
+
+    timings["duration"] = source.frame_id / source.fps
+    timings["fps"] = source.fps
+    return events, timings
+
+
+def replay_landmarks(path):
+    """replay() for a landmark dump: the stored hands go straight into GesturePipeline.step_points()"""
+    header, frames = load_landmarks(path)
+    scale = np.array([header["width"], header["height"], header["width"]], dtype=np.float32)
+    pipeline = GesturePipeline(MAX_HANDS, MAX_DISTANCE, HOLD_TIME_NEEDED)
+
+    events = []
+    timings = {"frames": 0, "decode": 0.0, "inference": 0.0, "gestures": 0.0}
+    for record in frames:
+        start = time.perf_counter()
+        frame_time = float(header["start_time"] + record["time"])
+        batch = record["points"][:record["count"]].astype(np.float32) * scale
+        decoded = time.perf_counter()
+
+        found, _, _ = pipeline.step_points(batch, frame_time)
+        events += [(frame_time, event, hand_id) for event, hand_id in found]
+        done = time.perf_counter()
+
+        timings["frames"] += 1
+        timings["decode"] += decoded - start
+        timings["gestures"] += done - decoded
+
+    fps = float(header["fps"]) or 15.0
+    timings["duration"] = (float(frames["time"][-1]) + 1 / fps) if len(frames) else 0.0
+    timings["fps"] = fps
+    return events, timings
+
+
+# ===== Synthetic landmark fixture =====
+def hand_pose(kind, cx, cy):
+    """(21, 3) pixel landmarks of a "palm", "fist" or "ok" hand centred near (cx, cy)"""
+    points = np.zeros((21, 3), dtype=np.float32)
+    points[0] = (cx, cy + 80, 0)
+    # Thumb CMC, MCP, IP; the tip is placed below
+    points[1:4] = [(cx - 40, cy + 60, 0), (cx - 55, cy + 40, 0), (cx - 65, cy + 20, 0)]
+    points[4] = (cx - 55, cy, 0) if kind == "palm" else (cx - 75, cy, 0)
+    for finger, mcp in enumerate((5, 9, 13, 17)):
+        x = cx - 30 + 20 * finger
+        points[mcp] = (x, cy, 0)
+        if kind == "palm" or (kind == "ok" and finger > 0):
+            points[mcp + 1:mcp + 4] = [(x, cy - 30, 0), (x, cy - 50, 0), (x, cy - 70, 0)]
+        else:
+            # Curled: the tip ends up below its PIP joint
+            points[mcp + 1:mcp + 4] = [(x, cy - 20, 0), (x, cy - 5, 0), (x, cy + 10, 0)]
+    if kind == "ok":
+        points[8] = points[4] + (6, 6, 0)
+    return points
+
+
+# (start s, end s, [(kind, cx, cy), ...]) at 15 fps on a 640x480 frame
+FIXTURE_SCRIPT = [
+    (1.0, 2.0, [("palm", 320, 240)]),
+    (2.0, 3.0, [("fist", 320, 240)]),
+    (3.0, 4.0, [("palm", 320, 240)]),
+    (4.0, 5.5, [("ok", 320, 240)]),  # let go before the 2 s hold
+    (5.5, 7.0, [("palm", 320, 240)]),
+    (7.0, 9.5, [("ok", 320, 240)]),  # held: emergency at 9 s, then the timer restarts
+    (9.5, 10.5, [("palm", 200, 240)]),
+    (10.5, 12.0, [("palm", 200, 240), ("fist", 460, 240)]),  # second hand gets its own ID
+]
+
+
+def write_fixture(path, fps=15.0, seconds=13.0, w=640, h=480):
+    """Landmark dump of FIXTURE_SCRIPT, a regression clip that needs no camera or MediaPipe"""
+    writer = LandmarkWriter(path, MAX_HANDS, fps)
+    writer.open(w, h, 0.0)
+    scale = np.array([w, h, w], dtype=np.float32)
+    frames = np.repeat(writer.blank, int(seconds * fps))
+    for i, record in enumerate(frames):
+        t = i / fps
+        record["time"] = t
+        hands = next((hands for start, end, hands in FIXTURE_SCRIPT if start <= t < end), [])
+        record["count"] = len(hands)
+        for j, (kind, cx, cy) in enumerate(hands):
+            record["points"][j] = hand_pose(kind, cx, cy) / scale
+            record["handedness"][j] = 1
+            record["score"][j] = 0.99
+    writer.append(frames)
+    writer.close()
+    return path
+
+
+def compare(events, expected, tolerance):
+    """(matched, missed, extra) with each expected event matched at most once"""
+    used = [False] * len(events)
+    matched = 0
+    for t, name in expected:
+        for i, (found_t, found_name, _) in enumerate(events):
+            if not used[i] and found_name == name and abs(found_t - t) <= tolerance:
+                used[i] = True
+                matched += 1
+                break
+    return matched, len(expected) - matched, used.count(False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded video through the gesture logic")
+    parser.add_argument("clips", nargs="*", default=["clips"],
+                        help="videos, landmark dumps or folders (default: clips/)")
+    parser.add_argument("--complexity", type=int, default=1, help="MediaPipe model complexity")
+    parser.add_argument("--no-roi", action="store_true", help="run MediaPipe on full frames")
+    parser.add_argument("--compare-roi", action="store_true",
+                        help="also replay videos on full frames and compare MediaPipe cost with ROI on the same frames")
+    parser.add_argument("--flip", action="store_true", help="mirror frames, for raw camera recordings")
+    parser.add_argument("--fps", type=float, help="override the clip frame rate")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="event time match window, s")
+    parser.add_argument("--min-fps", type=float, default=0.0, help="fail below this replay speed")
+    parser.add_argument("--dump", action="store_true", help="also write <clip>.landmarks for landmarks.py")
+    parser.add_argument("--update", action="store_true", help="store the events as the new expected ones")
+    parser.add_argument("--fixture", metavar="PATH", help="write the synthetic landmark clip to PATH and exit")
+    args = parser.parse_args()
+
+    if args.fixture:
+        write_fixture(args.fixture)
+        print(f"💾 Wrote {args.fixture}")
+        sys.exit(0)
+
+    clips = find_clips(args.clips)
+    if not clips:
+        parser.error("no clips found; record some with 'Hand recognition.py' (output.avi) into clips/")
+
+    if args.compare_roi and args.no_roi:
+        parser.error("--compare-roi already runs both modes, leave out --no-roi")
+
+    failed = False
+    total_frames = total_duration = total_elapsed = total_logic = 0.0
+    roi_inference = full_inference = 0.0
+    for clip in clips:
+        if clip.endswith(DUMP_EXTENSION):
+            events, timings = replay_landmarks(clip)
+        else:
+            dump = clip.rsplit(".", 1)[0] + DUMP_EXTENSION if args.dump else None
+            events, timings = replay(clip, args.complexity, not args.no_roi, args.flip, args.fps, dump)
+        elapsed = timings["decode"] + timings["inference"] + timings["gestures"]
+        frames = max(1, timings["frames"])
+        total_frames += timings["frames"]
+        total_duration += timings["duration"]
+        total_elapsed += elapsed
+        total_logic += timings["gestures"]
+
+        print(f"\n🎬 {os.path.basename(clip)}: {timings['frames']} frames, {timings['duration']:.1f} s "
+              f"at {timings['fps']:.0f} fps")
+        for t, event, hand_id in events:
+            print(f"   {t:7.2f} s  {event:<9} hand {hand_id}")
+        speed = timings["frames"] / elapsed if elapsed else 0.0
+        print(f"   ⏱ {speed:.0f} fps (x{timings['duration'] / elapsed if elapsed else 0:.1f} real time): "
+              f"decode {timings['decode'] / frames * 1000:.1f} ms, "
+              f"MediaPipe {timings['inference'] / frames * 1000:.1f} ms, "
+              f"gestures {timings['gestures'] / frames * 1e6:.0f} µs per frame")
+        if speed < args.min_fps:
+            print(f"   ❌ slower than --min-fps {args.min_fps:.0f}")
+            failed = True
+
+        if args.compare_roi and not clip.endswith(DUMP_EXTENSION):
+            # A/B on identical frames: the ROI run above against a plain full-frame run
+            full_events, full_timings = replay(clip, args.complexity, False, args.flip, args.fps)
+            roi_inference += timings["inference"]
+            full_inference += full_timings["inference"]
+            matched, missed, extra = compare(full_events, [(t, e) for t, e, _ in events], args.tolerance)
+            agree = "same events" if not (missed or extra) else f"events differ: {missed} missed, {extra} extra"
+            print(f"   🆚 MediaPipe per frame: ROI {timings['inference'] / frames * 1000:.1f} ms, "
+                  f"full frame {full_timings['inference'] / frames * 1000:.1f} ms "
+                  f"(x{full_timings['inference'] / max(timings['inference'], 1e-9):.2f}), {agree} on full frames")
+
+        if args.update:
+            save_expected(clip, events, timings["fps"])
+            print(f"   💾 {len(events)} events saved to {os.path.basename(expected_path(clip))}")
+            continue
+        expected = load_expected(clip)
+        if expected is None:
+            print("   ⚠️ no expected events, run with --update to store these")
+            continue
+        matched, missed, extra = compare(events, expected, args.tolerance)
+        if missed or extra:
+            print(f"   ❌ {matched}/{len(expected)} expected events, {missed} missed, {extra} extra")
+            failed = True
+        else:
+            print(f"   ✅ all {matched} expected events")
+
+    if total_elapsed:
+        print(f"\n📊 {len(clips)} clips, {total_frames:.0f} frames in {total_elapsed:.1f} s: "
+              f"{total_frames / total_elapsed:.0f} fps, x{total_duration / total_elapsed:.1f} real time, "
+              f"gesture logic {total_frames / max(total_logic, 1e-9):.0f} fps")
+    if roi_inference:
+        print(f"🆚 ROI vs full-frame MediaPipe on the same frames: x{full_inference / roi_inference:.2f}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,231 @@
+import numpy as np
+
+
+# ===== Landmark indices (MediaPipe hand model) =====
+WRIST = 0
+THUMB_IP = 3
+THUMB_TIP = 4
+INDEX_TIP = 8
+MIDDLE_MCP = 9
+FINGER_TIPS = np.array([8, 12, 16, 20])  # index, middle, ring, pinky
+FINGER_DIPS = FINGER_TIPS - 1
+FINGER_PIPS = FINGER_TIPS - 2
+
+
+def landmarks_to_array(hand_landmarks, w, h, out=None):
+    """Convert MediaPipe landmarks to a (21, 3) float32 array in pixels"""
+    if out is None:
+        out = np.empty((21, 3), dtype=np.float32)
+    for i, p in enumerate(hand_landmarks.landmark):
+        out[i, 0] = p.x
+        out[i, 1] = p.y
+        out[i, 2] = p.z
+    out[:, 0] *= w
+    out[:, 1] *= h
+    out[:, 2] *= w
+    return out
+
+
+def hand_features(points):
+    """Features shared by all classifiers.
+
+    points is a (21, 3) array or a batch (..., 21, 3); every feature
+    keeps the leading batch dimensions.
+      fingers  - (..., 5) thumb out + finger tip above its PIP joint
+      extended - (..., 4) tip above both PIP and DIP (index..pinky)
+      pinch    - (...,) thumb tip to index tip distance in pixels
+      palm     - (...,) wrist to middle MCP distance, the hand scale
+    """
+    y = points[..., 1]
+    tips_y = y[..., FINGER_TIPS]
+    tips_up = tips_y < y[..., FINGER_PIPS]
+    extended = tips_up & (tips_y < y[..., FINGER_DIPS])
+    thumb_out = points[..., THUMB_TIP, 0] > points[..., THUMB_IP, 0]
+
+    fingers = np.concatenate([thumb_out[..., None], tips_up], axis=-1)
+    pinch = np.linalg.norm(points[..., THUMB_TIP, :2] - points[..., INDEX_TIP, :2], axis=-1)
+    palm = np.linalg.norm(points[..., WRIST, :2] - points[..., MIDDLE_MCP, :2], axis=-1)
+
+    return {"fingers": fingers, "extended": extended, "pinch": pinch, "palm": palm}
+
+
+def classify_gesture(features):
+    """Fist / palm / other from the finger count"""
+    count = features["fingers"].sum(axis=-1)
+    gesture = np.where(count == 0, "fist", np.where(count == 5, "palm", "other"))
+    return gesture if gesture.ndim else str(gesture)
+
+
+def is_ok_gesture(features, max_distance):
+    """Thumb and index tips touching while middle, ring and pinky are extended"""
+    return (features["pinch"] < max_distance) & features["extended"][..., 1:].all(axis=-1)
+
+
+# ===== Multi-hand tracking =====
+PALM_IDS = np.array([0, 5, 9, 13, 17])
+
+
+class HandState:
+    """Gesture timers that belong to one tracked hand"""
+
+    def __init__(self):
+        self.ok_active = False
+        self.ok_start = 0
+        self.fist_active = False
+        self.fist_start = 0
+        self.gesture = "none"
+
+
+class HandTracker:
+    """Gives each visible hand a stable ID across frames.
+
+    Hands are matched to existing tracks greedily by palm-centre distance.
+    A track survives max_missed frames without a match so a short
+    detection dropout does not hand its ID (and timers) to someone else.
+    """
+
+    def __init__(self, max_jump=150, max_missed=5):
+        self.max_jump = max_jump
+        self.max_missed = max_missed
+        self.next_id = 1
+        self.ids = []
+        self.centers = np.empty((0, 2), dtype=np.float32)
+        self.missed = []
+        self.states = {}
+
+    def update(self, points):
+        """Match a (N, 21, 3) batch of hands; returns the list of N track IDs"""
+        centers = points[:, PALM_IDS, :2].mean(axis=1)
+        n = len(centers)
+        hand_ids = [None] * n
+        matched = set()
+
+        if self.ids and n:
+            dist = np.linalg.norm(self.centers[:, None, :] - centers[None, :, :], axis=-1)
+            for flat in np.argsort(dist, axis=None):
+                t, d = divmod(int(flat), n)
+                if dist[t, d] > self.max_jump:
+                    break
+                if t in matched or hand_ids[d] is not None:
+                    continue
+                hand_ids[d] = self.ids[t]
+                matched.add(t)
+
+        ids, kept_centers, missed = [], [], []
+        for t, track_id in enumerate(self.ids):
+            if t in matched:
+                continue
+            if self.missed[t] < self.max_missed:
+                ids.append(track_id)
+                kept_centers.append(self.centers[t])
+                missed.append(self.missed[t] + 1)
+            else:
+                del self.states[track_id]
+
+        for d in range(n):
+            if hand_ids[d] is None:
+                hand_ids[d] = self.next_id
+                self.states[self.next_id] = HandState()
+                self.next_id += 1
+            ids.append(hand_ids[d])
+            kept_centers.append(centers[d])
+            missed.append(0)
+
+        self.ids = ids
+        self.centers = np.array(kept_centers, dtype=np.float32).reshape(-1, 2)
+        self.missed = missed
+        return hand_ids
+
+
+def update_hand_states(tracker, hand_ids, ok_flags, gestures, current_time, hold_time_needed):
+    """Advance every tracked hand's OK timer and fist edge.
+
+    Returns (events, time_left) where events is a list of
+    (event, hand_id) with event one of "ok_start", "emergency" or
+    "fist", and time_left is the shortest remaining OK hold, or None.
+    Hands never share timers, so a second hand cannot reset or take
+    over another hand's countdown.
+    """
+    events = []
+    time_left = None
+
+    for hand_id, state in tracker.states.items():
+        if hand_id not in hand_ids:
+            state.ok_active = False
+            state.fist_active = False
+            state.gesture = "none"
+
+    for i, hand_id in enumerate(hand_ids):
+        state = tracker.states[hand_id]
+        state.gesture = str(gestures[i])
+
+        if ok_flags[i]:
+            if not state.ok_active:
+                state.ok_active = True
+                state.ok_start = current_time
+                events.append(("ok_start", hand_id))
+
+            hand_left = hold_time_needed - (current_time - state.ok_start)
+            if hand_left > 0:
+                if time_left is None or hand_left < time_left:
+                    time_left = hand_left
+            else:
+                events.append(("emergency", hand_id))
+                state.ok_active = False
+        else:
+            state.ok_active = False
+
+        if state.gesture == "fist":
+            if not state.fist_active:
+                state.fist_active = True
+                state.fist_start = current_time
+                events.append(("fist", hand_id))
+        else:
+            state.fist_active = False
+
+    return events, time_left
+
+
+# ===== Per-frame gesture logic =====
+class GesturePipeline:
+    """Landmarks -> classifiers -> tracker -> hold timers for one frame.
+
+    The station and gesture_replay.py both go through step(), so a
+    recorded clip exercises the same gesture and hold-timer logic as the
+    camera; landmark dumps come in through step_points(). points holds
+    the pixel landmarks of the last frame.
+    """
+
+    def __init__(self, max_hands=2, max_distance=24, hold_time_needed=2, tracker=None):
+        self.max_distance = max_distance
+        self.hold_time_needed = hold_time_needed
+        self.points = np.empty((max_hands, 21, 3), dtype=np.float32)
+        self.tracker = tracker if tracker is not None else HandTracker()
+        self.count = 0
+
+    def step(self, hand_list, w, h, current_time):
+        """Returns (events, time_left, hand_ids) like update_hand_states()"""
+        hand_list = hand_list[:len(self.points)]
+        for i, hand_landmarks in enumerate(hand_list):
+            landmarks_to_array(hand_landmarks, w, h, out=self.points[i])
+        return self.step_points(self.points[:len(hand_list)], current_time)
+
+    def step_points(self, batch, current_time):
+        """step() for a (N, 21, 3) batch already in pixels, e.g. from a landmark dump"""
+        self.count = n = min(len(batch), len(self.points))
+        self.points[:n] = batch[:n]
+        hand_ids = []
+        ok_flags = gestures = ()
+
+        if n:
+            batch = self.points[:n]
+            features = hand_features(batch)
+            ok_flags = is_ok_gesture(features, self.max_distance)
+            gestures = classify_gesture(features)
+            hand_ids = self.tracker.update(batch)
+        else:
+            self.tracker.update(self.points[:0])
+
+        events, time_left = update_hand_states(
+            self.tracker, hand_ids, ok_flags, gestures, current_time, self.hold_time_needed)
+        return events, time_left, hand_ids
@@ -0,0 +1,272 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# ===== ROI-cropped hand inference =====
+class RoiHands:
+    """Runs MediaPipe Hands on a downscaled crop around the last seen hands.
+
+    Landmarks are mapped back to full-frame normalised coordinates, so
+    callers see the same results object as from hands.process(). The
+    crop only moves when the hands leave it, which keeps MediaPipe's own
+    frame-to-frame tracking stable. If no hand is found inside the crop,
+    the same frame is searched again at full size, and a full-frame pass
+    runs every full_frame_every frames to pick up new hands.
+    """
+
+    def __init__(self, hands, margin=0.3, max_side=256, full_frame_every=30):
+        self.hands = hands
+        self.margin = margin
+        self.max_side = max_side
+        self.full_frame_every = full_frame_every
+        self.roi = None
+        self.frames_since_full = 0
+
+        # Cost of each path. They see different frames (tracking vs detection),
+        # so their ratio is not a speedup; gesture_replay.py --compare-roi measures that
+        self.roi_time = 0.0
+        self.roi_frames = 0
+        self.full_time = 0.0
+        self.full_frames = 0
+        self.lost_tracks = 0
+
+    def process(self, rgb):
+        h, w = rgb.shape[:2]
+        results = None
+
+        if self.roi is not None and self.frames_since_full < self.full_frame_every:
+            start = time.perf_counter()
+            results = self._process_roi(rgb, w, h)
+            self.roi_time += time.perf_counter() - start
+            self.roi_frames += 1
+            self.frames_since_full += 1
+
+            if not results.multi_hand_landmarks:
+                self.lost_tracks += 1
+                results = None
+
+        if results is None:
+            start = time.perf_counter()
+            results = self.hands.process(rgb)
+            self.full_time += time.perf_counter() - start
+            self.full_frames += 1
+            self.frames_since_full = 0
+
+        self._update_roi(results, w, h)
+        return results
+
+    def _process_roi(self, rgb, w, h):
+        x0, y0, x1, y1 = self.roi
+        cw, ch = x1 - x0, y1 - y0
+        crop = rgb[y0:y1, x0:x1]
+
+        scale = self.max_side / max(cw, ch)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(cw * scale)), max(1, int(ch * scale))),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            crop = np.ascontiguousarray(crop)
+
+        results = self.hands.process(crop)
+        if results.multi_hand_landmarks:
+            for hand_landmarks in results.multi_hand_landmarks:
+                for p in hand_landmarks.landmark:
+                    p.x = (p.x * cw + x0) / w
+                    p.y = (p.y * ch + y0) / h
+                    p.z = p.z * cw / w
+        return results
+
+    def _update_roi(self, results, w, h):
+        if not results.multi_hand_landmarks:
+            self.roi = None
+            return
+
+        xs = [p.x for hl in results.multi_hand_landmarks for p in hl.landmark]
+        ys = [p.y for hl in results.multi_hand_landmarks for p in hl.landmark]
+        bx0, bx1 = min(xs) * w, max(xs) * w
+        by0, by1 = min(ys) * h, max(ys) * h
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            box_area = (bx1 - bx0) * (by1 - by0)
+            roi_area = (x1 - x0) * (y1 - y0)
+            if x0 <= bx0 and y0 <= by0 and bx1 <= x1 and by1 <= y1 and box_area > 0.15 * roi_area:
+                return
+
+        side = max(bx1 - bx0, by1 - by0) * (1 + 2 * self.margin)
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        x0 = int(max(0, cx - side / 2))
+        y0 = int(max(0, cy - side / 2))
+        x1 = int(min(w, cx + side / 2))
+        y1 = int(min(h, cy + side / 2))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 16 and y1 - y0 > 16 else None
+
+    def stats(self):
+        """Per-path inference cost in milliseconds.
+
+        roi_ms averages frames where a hand was being tracked, including
+        failed crop attempts; full_ms averages the full-frame passes
+        (no hand yet, re-detection after a lost crop, periodic rescans).
+        """
+        roi_ms = 1000 * self.roi_time / self.roi_frames if self.roi_frames else 0.0
+        full_ms = 1000 * self.full_time / self.full_frames if self.full_frames else 0.0
+        return {
+            "roi_frames": self.roi_frames,
+            "full_frames": self.full_frames,
+            "roi_ms": roi_ms,
+            "full_ms": full_ms,
+            "lost_tracks": self.lost_tracks,
+        }
+
+
+# ===== Adaptive quality =====
+# Ordered from best to cheapest; each step gives up the least visible thing first.
+# Drawing runs on the OverlayRenderer thread, so it is not a step: it costs the main loop nothing.
+QUALITY_LADDER = [
+    {"name": "full", "scale": 1.0, "complexity": 1, "skip": 0},
+    {"name": "75% res", "scale": 0.75, "complexity": 1, "skip": 0},
+    {"name": "lite model", "scale": 0.75, "complexity": 0, "skip": 0},
+    {"name": "50% res", "scale": 0.5, "complexity": 0, "skip": 0},
+    {"name": "skip 1/2", "scale": 0.5, "complexity": 0, "skip": 1},
+    {"name": "skip 2/3", "scale": 0.5, "complexity": 0, "skip": 2},
+]
+
+
+class QualityController:
+    """Steps down QUALITY_LADDER when frames cost more than the budget.
+
+    record() takes the processing cost of one frame. Costs are smoothed
+    with an EMA and spread over skipped frames. The level drops when the
+    average is over budget and rises again when it is below
+    headroom * budget. After every change the controller waits `dwell`
+    frames so the new level can settle.
+    """
+
+    def __init__(self, target_fps=15, ladder=QUALITY_LADDER, headroom=0.6, dwell=15, alpha=0.2):
+        self.budget = 1.0 / target_fps
+        self.ladder = ladder
+        self.headroom = headroom
+        self.dwell = dwell
+        self.alpha = alpha
+        self.level = 0
+        self.avg_cost = 0.0
+        self.frames_at_level = 0
+        self.frame_counter = 0
+        self.changes = 0
+
+    @property
+    def settings(self):
+        return self.ladder[self.level]
+
+    def should_process(self):
+        """False for frames the current level skips"""
+        self.frame_counter += 1
+        return self.frame_counter % (self.settings["skip"] + 1) == 0
+
+    def record(self, cost):
+        """Feed one frame's cost in seconds; returns True if the level changed"""
+        cost /= self.settings["skip"] + 1
+        if self.frames_at_level == 0:
+            self.avg_cost = cost
+        else:
+            self.avg_cost += self.alpha * (cost - self.avg_cost)
+        self.frames_at_level += 1
+
+        if self.frames_at_level < self.dwell:
+            return False
+
+        if self.avg_cost > self.budget and self.level < len(self.ladder) - 1:
+            self.level += 1
+        elif self.avg_cost < self.headroom * self.budget and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+
+        self.frames_at_level = 0
+        self.changes += 1
+        return True
+
+
+# ===== Motion-gated idle mode =====
+class MotionGate:
+    """Keeps hand inference asleep until something moves in front of the camera.
+
+    While idle only a small grayscale thumbnail goes through MOG2
+    background subtraction. Once the moving fraction of the thumbnail
+    crosses motion_threshold the gate wakes up, and after quiet_period
+    seconds without motion or hands it goes back to idle.
+    """
+
+    def __init__(self, thumb_size=(80, 60), motion_threshold=0.02, quiet_period=10.0):
+        self.thumb_size = thumb_size
+        self.motion_threshold = motion_threshold
+        self.quiet_period = quiet_period
+        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=200, varThreshold=25, detectShadows=False)
+
+        self.awake = True
+        self.last_activity = None
+        self.motion_onset = None
+
+        self.idle_frames = 0
+        self.gate_time = 0.0
+        self.inference_time = 0.0
+        self.inference_frames = 0
+        self.wake_ups = 0
+        self.wake_latency = 0.0
+
+    def check(self, frame, now):
+        """Returns True when this frame should go through hand inference"""
+        start = time.perf_counter()
+        thumb = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        fg_mask = self.bg_subtractor.apply(gray)
+        motion = cv2.countNonZero(fg_mask) / fg_mask.size
+        self.gate_time += time.perf_counter() - start
+
+        if self.last_activity is None:
+            self.last_activity = now
+
+        if motion > self.motion_threshold:
+            self.last_activity = now
+            if not self.awake:
+                self.awake = True
+                self.wake_ups += 1
+                onset = self.motion_onset if self.motion_onset is not None else now
+                self.wake_latency += now - onset
+                self.motion_onset = None
+                print(f"👀 Motion detected, waking up ({motion:.1%} of frame)")
+        elif not self.awake and motion > self.motion_threshold / 4 and self.motion_onset is None:
+            # First sign of movement, used to measure how long waking up took
+            self.motion_onset = now
+        elif not self.awake and motion == 0:
+            self.motion_onset = None
+
+        if self.awake and now - self.last_activity > self.quiet_period:
+            self.awake = False
+            print("💤 No motion, going idle")
+
+        if not self.awake:
+            self.idle_frames += 1
+        return self.awake
+
+    def activity(self, now):
+        """Keep the gate awake, e.g. while a hand is visible but still"""
+        self.last_activity = now
+
+    def record_inference(self, cost):
+        """Cost of one full inference pass, used to estimate CPU time saved"""
+        self.inference_time += cost
+        self.inference_frames += 1
+
+    def stats(self):
+        avg_inference = self.inference_time / self.inference_frames if self.inference_frames else 0.0
+        return {
+            "idle_frames": self.idle_frames,
+            "saved_s": self.idle_frames * avg_inference - self.gate_time,
+            "gate_s": self.gate_time,
+            "wake_ups": self.wake_ups,
+            "wake_latency_ms": 1000 * self.wake_latency / self.wake_ups if self.wake_ups else 0.0,
+        }
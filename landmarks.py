@@ -0,0 +1,223 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from gestures import classify_gesture, hand_features, is_ok_gesture
+
+MAGIC = b"HANDLMK2"
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("max_hands", "<u4"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    ("fps", "<f4"),
+    ("start_time", "<f8"),
+    ("reserved", "V32"),
+])  # 64 bytes
+
+HANDEDNESS = {"Left": 0, "Right": 1}
+GESTURES = ("none", "fist", "palm", "other")
+
+
+def frame_dtype(max_hands):
+    """One fixed-size record per processed frame"""
+    return np.dtype([
+        ("time", "<f8"),  # seconds since start_time; float32 steps are already 8 ms after 18 h
+        ("count", "u1"),  # hands found
+        ("handedness", "i1", (max_hands,)),  # HANDEDNESS value, -1 for no hand
+        ("score", "<f2", (max_hands,)),
+        ("points", "<f2", (max_hands, 21, 3)),  # normalised x, y, z as MediaPipe returns them
+    ])
+
+
+# ===== Dump =====
+class LandmarkWriter:
+    """Appends MediaPipe results to a fixed-layout binary file.
+
+    The file is a 64-byte header followed by frame_dtype records, so
+    load_landmarks() can np.memmap it without parsing. Coordinates stay
+    normalised in float16, about half a pixel at 1024 wide; the loader
+    scales them by the frame size from the header exactly like
+    landmarks_to_array(). write() opens the file and writes the header
+    with the first frame, when the frame size is known; call open()
+    first to write records in bulk with append(). Records are buffered
+    and written flush_every frames at a time.
+    """
+
+    def __init__(self, path, max_hands=2, fps=0.0, flush_every=256):
+        self.path = path
+        self.max_hands = max_hands
+        self.fps = fps
+        self.file = None
+        self.start_time = None
+        self.frames = 0
+
+        self.blank = np.zeros(1, dtype=frame_dtype(max_hands))
+        self.blank["handedness"] = -1
+        self.buffer = np.repeat(self.blank, flush_every)
+        self.pending = 0
+
+    def open(self, w, h, start_time):
+        """Create the file and write the header; times are stored relative to start_time"""
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["max_hands"] = self.max_hands
+        header["width"] = w
+        header["height"] = h
+        header["fps"] = self.fps
+        header["start_time"] = start_time
+        self.file = open(self.path, "wb")
+        self.file.write(header.tobytes())
+        self.start_time = start_time
+
+    def write(self, frame_time, results, w, h):
+        """Record one frame; results is None for frames where MediaPipe did not run"""
+        if self.file is None:
+            self.open(w, h, frame_time)
+
+        row = self.buffer[self.pending]
+        row["time"] = frame_time - self.start_time
+        hand_list = (results.multi_hand_landmarks or []) if results is not None else []
+        handedness = (results.multi_handedness or []) if results is not None else []
+        row["count"] = min(len(hand_list), self.max_hands)
+        for i, hand_landmarks in enumerate(hand_list[:self.max_hands]):
+            row["points"][i] = [(p.x, p.y, p.z) for p in hand_landmarks.landmark]
+            if i < len(handedness):
+                label = handedness[i].classification[0]
+                row["handedness"][i] = HANDEDNESS.get(label.label, -1)
+                row["score"][i] = label.score
+
+        self.pending += 1
+        self.frames += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def append(self, frames):
+        """Write already built frame_dtype records, e.g. when merging dumps"""
+        self.flush()
+        self.file.write(np.ascontiguousarray(frames, dtype=self.blank.dtype).tobytes())
+        self.frames += len(frames)
+
+    def flush(self):
+        if self.pending:
+            self.file.write(self.buffer[:self.pending].tobytes())
+            self.buffer[:self.pending] = self.blank
+            self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+# ===== Load =====
+def load_landmarks(path):
+    """(header, frames) where frames is a read-only np.memmap of frame_dtype records.
+
+    A record cut short by a crash at the end of the file is ignored.
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1 or header["magic"][0] != MAGIC:
+        raise ValueError(f"{path}: not a landmark dump")
+    header = header[0]
+    dtype = frame_dtype(int(header["max_hands"]))
+    count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // dtype.itemsize
+    frames = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+    return header, frames
+
+
+def classify_frames(header, frames, max_distances=(24,), batch=1 << 18):
+    """Run the station's classifiers over stored frames in vectorised batches.
+
+    Returns (gestures, ok) where gestures is (N, max_hands) uint8 indices
+    into GESTURES and ok is (len(max_distances), N, max_hands) bool, one
+    plane per OK distance so a whole threshold sweep costs one pass.
+    """
+    n = len(frames)
+    max_hands = frames.dtype["handedness"].shape[0]
+    scale = np.array([header["width"], header["height"], header["width"]], dtype=np.float32)
+    gestures = np.zeros((n, max_hands), dtype=np.uint8)
+    ok = np.zeros((len(max_distances), n, max_hands), dtype=bool)
+
+    for start in range(0, n, batch):
+        chunk = frames[start:start + batch]
+        present = np.arange(max_hands) < chunk["count"][:, None]
+        points = chunk["points"].astype(np.float32) * scale
+        features = hand_features(points)
+
+        gesture = classify_gesture(features)
+        codes = np.select([gesture == "fist", gesture == "palm"], [1, 2], 3)
+        gestures[start:start + len(chunk)] = np.where(present, codes, 0)
+        for i, max_distance in enumerate(max_distances):
+            ok[i, start:start + len(chunk)] = is_ok_gesture(features, max_distance) & present
+
+    return gestures, ok
+
+
+# ===== Synthetic dump for benchmarking =====
+def write_demo(path, frames=1_000_000, chunk=100_000, seed=0):
+    """Random hand poses at 15 fps, written in bulk through LandmarkWriter.append()"""
+    rng = np.random.default_rng(seed)
+    writer = LandmarkWriter(path, fps=15.0)
+    writer.open(1024, 576, 0.0)
+    for start in range(0, frames, chunk):
+        size = min(chunk, frames - start)
+        records = np.repeat(writer.blank, size)
+        records["time"] = (start + np.arange(size)) / 15.0
+        records["count"] = rng.integers(0, 3, size)
+        present = np.arange(2) < records["count"][:, None]
+        records["handedness"] = np.where(present, rng.integers(0, 2, (size, 2)), -1)
+        records["score"] = np.where(present, rng.uniform(0.9, 1.0, (size, 2)), 0)
+        centre = rng.uniform(0.3, 0.7, (size, 2, 1, 3))
+        records["points"] = centre + rng.normal(0, 0.05, (size, 2, 21, 3))
+        writer.append(records)
+    writer.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the gesture classifiers over landmark dumps")
+    parser.add_argument("files", nargs="*", help="dumps from gesture_replay.py --dump or LANDMARK_DUMP_PATH")
+    parser.add_argument("--max-distance", default="24", help="comma separated OK distances to sweep, px")
+    parser.add_argument("--batch", type=int, default=1 << 18, help="frames per vectorised batch")
+    parser.add_argument("--demo", type=int, metavar="FRAMES", help="benchmark on a generated dump")
+    args = parser.parse_args()
+
+    files = list(args.files)
+    demo_path = None
+    if args.demo:
+        demo_path = os.path.join(tempfile.mkdtemp(), "demo.landmarks")
+        start = time.perf_counter()
+        write_demo(demo_path, args.demo)
+        print(f"💾 Wrote {args.demo} frames ({os.path.getsize(demo_path) / 2**20:.0f} MiB) "
+              f"in {time.perf_counter() - start:.1f} s")
+        files.append(demo_path)
+    if not files:
+        parser.error("give landmark dumps or --demo FRAMES")
+
+    distances = [float(d) for d in args.max_distance.split(",")]
+    for path in files:
+        header, frames = load_landmarks(path)
+        start = time.perf_counter()
+        gestures, ok = classify_frames(header, frames, distances, args.batch)
+        elapsed = time.perf_counter() - start
+
+        hands = int(frames["count"].sum())
+        duration = float(frames["time"][-1]) if len(frames) else 0.0
+        print(f"\n🖐 {os.path.basename(path)}: {len(frames)} frames, {hands} hands, "
+              f"{duration / 60:.1f} min at {header['width']}x{header['height']}")
+        counts = np.bincount(gestures.ravel(), minlength=len(GESTURES))
+        print("   " + ", ".join(f"{name} {count}" for name, count in zip(GESTURES[1:], counts[1:])))
+        for max_distance, plane in zip(distances, ok):
+            print(f"   OK within {max_distance:g} px: {int(plane.sum())} hands")
+        print(f"   ⏱ {elapsed:.2f} s, {len(frames) / max(elapsed, 1e-9) / 1e6:.1f} M frames/s")
+
+    if demo_path:
+        # Let go of the memmap before deleting the file
+        del frames
+        os.remove(demo_path)
+        os.rmdir(os.path.dirname(demo_path))
@@ -0,0 +1,367 @@
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+
+def fold_command(current, payload):
+    """Combine a pending POWER command with a newer one into one final command.
+
+    ON/OFF replaces whatever is pending, TOGGLE flips a pending ON/OFF,
+    and two TOGGLEs cancel out (None means nothing left to send).
+    """
+    if payload != "TOGGLE":
+        return payload
+    if current == "ON":
+        return "OFF"
+    if current == "OFF":
+        return "ON"
+    if current == "TOGGLE":
+        return None
+    return "TOGGLE"
+
+
+def device_prefix(topic):
+    """cmnd/tasmota_DEE65D/POWER1 -> cmnd/tasmota_DEE65D"""
+    return topic.rsplit("/", 1)[0]
+
+
+# ===== Device registry =====
+class DeviceRegistry:
+    """Maps station actions to Tasmota devices and relay channels.
+
+    actions looks like {"fist": [("tasmota_DEE65D", 1, "TOGGLE"),
+    ("tasmota_A1B2C3", 2, "ON")]}. Channels of one device end up in a
+    single Backlog message once they reach the CommandPipeline.
+    """
+
+    def __init__(self, actions):
+        self.actions = actions
+
+    def commands(self, action):
+        return [(f"cmnd/{device}/POWER{channel}", command)
+                for device, channel, command in self.actions.get(action, [])]
+
+    def run(self, action, pipeline):
+        """Send every command of an action; returns how many were queued"""
+        commands = self.commands(action)
+        for topic, command in commands:
+            pipeline.command(topic, command)
+        return len(commands)
+
+
+# ===== Command publish pipeline =====
+class CommandPipeline:
+    """Sits in front of the paho client for Tasmota POWER commands.
+
+    Commands to the same topic that arrive within `window` seconds are
+    folded into one final command with fold_command(). Each topic can
+    have its own QoS. The time from publish to PUBACK (or, for QoS 0,
+    until paho hands the packet to the socket) is taken from on_publish
+    and kept for the latency stats.
+
+    When several POWER<n> topics of the same device are due together,
+    they go out as a single Tasmota Backlog message, e.g.
+    cmnd/<device>/Backlog "POWER1 ON; POWER2 OFF".
+
+    While set_connected(False) is in effect, commands go to a bounded
+    offline queue instead. With offline_policy="latest" only the final
+    state per topic is kept; with "drop_oldest" the oldest commands are
+    dropped once offline_limit is reached. Offline commands are always
+    kept per POWER<n> topic, never as Backlog messages; when the
+    connection comes back they are folded per topic and only then
+    batched per device. A publish that finds the socket gone before
+    set_connected(False) arrives is only queued here at QoS 0; at QoS 1
+    and above paho keeps it and resends it after reconnecting, and a
+    second copy from this queue would toggle a relay twice.
+    """
+
+    def __init__(self, client, window=0.08, default_qos=1, qos_by_topic=None, history=1000,
+                 offline_limit=20, offline_policy="latest"):
+        self.client = client
+        self.window = window
+        self.default_qos = default_qos
+        self.qos_by_topic = qos_by_topic or {}
+
+        self.cond = threading.Condition()
+        self.pending = {}  # topic -> [payload, deadline]
+        self.inflight = {}  # mid -> (publish time, qos)
+        self.early_acks = {}  # mid -> ack time, when on_publish beats publish()
+        self.latencies = deque(maxlen=history)
+
+        self.connected = True
+        self.offline_policy = offline_policy
+        if offline_policy == "latest":
+            self.offline = OrderedDict()
+        else:
+            self.offline = deque(maxlen=offline_limit)
+        self.offline_limit = offline_limit
+
+        self.requested = 0
+        self.published = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.queued_offline = 0
+        self.dropped_offline = 0
+
+        self.running = False
+        self.thread = None
+        client.on_publish = self._on_publish
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def command(self, topic, payload):
+        """Queue ON, OFF or TOGGLE for topic; returns immediately"""
+        payload = payload.upper()
+        with self.cond:
+            self.requested += 1
+            entry = self.pending.get(topic)
+            if entry is None:
+                self.pending[topic] = [payload, time.monotonic() + self.window]
+                self.cond.notify()
+            else:
+                self.coalesced += 1
+                entry[0] = fold_command(entry[0], payload)
+
+    def _flush_loop(self):
+        while self.running:
+            with self.cond:
+                now = time.monotonic()
+                due_devices = {device_prefix(topic) for topic, (_, deadline) in self.pending.items()
+                               if deadline <= now}
+                if not due_devices:
+                    next_deadline = min((d for _, d in self.pending.values()), default=None)
+                    timeout = 0.5 if next_deadline is None else max(0.0, next_deadline - now)
+                    self.cond.wait(timeout)
+                    continue
+                # Take every pending channel of a due device so they share one Backlog
+                ready = [(topic, self.pending.pop(topic)[0]) for topic in list(self.pending)
+                         if device_prefix(topic) in due_devices]
+
+            self.publish_batched(ready)
+
+    def publish_batched(self, commands):
+        """Publish [(topic, payload), ...] with one message per device"""
+        by_device = {}
+        for topic, payload in commands:
+            if payload is not None:
+                by_device.setdefault(device_prefix(topic), []).append((topic, payload))
+
+        # paho only queues these for its network thread, so all devices are in flight together
+        for prefix, items in by_device.items():
+            if len(items) == 1:
+                self.publish(*items[0])
+            else:
+                backlog = "; ".join(f"{topic.rsplit('/', 1)[1]} {payload}" for topic, payload in items)
+                self.publish(f"{prefix}/Backlog", backlog, qos_topic=items[0][0], channels=items)
+
+    def publish(self, topic, payload, qos_topic=None, channels=None):
+        """Publish right away, bypassing the coalescing window.
+
+        channels lists the (topic, payload) commands a Backlog message
+        was built from; those are what goes to the offline queue.
+        """
+        if not self.connected:
+            self._queue_offline(channels or [(topic, payload)])
+            return None
+
+        qos = self.qos_by_topic.get(qos_topic or topic, self.default_qos)
+        start = time.perf_counter()
+        try:
+            info = self.client.publish(topic, payload, qos=qos)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ MQTT publish error: {e}")
+            return None
+
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0:
+            # Lost the broker between the check above and the publish; paho drops QoS 0
+            self._queue_offline(channels or [(topic, payload)])
+            return info
+        # With QoS >= 1 paho keeps a NO_CONN message and resends it after CONNACK,
+        # so it is tracked like any other publish instead of being queued a second time
+        if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+            self.errors += 1
+            print(f"❌ MQTT publish to {topic} failed (rc={info.rc})")
+            return info
+
+        with self.cond:
+            self.published += 1
+            acked = self.early_acks.pop(info.mid, None)
+            if acked is not None:
+                self.latencies.append(acked - start)
+            else:
+                self.inflight[info.mid] = (start, qos)
+        return info
+
+    def _queue_offline(self, commands):
+        with self.cond:
+            for topic, payload in commands:
+                self.queued_offline += 1
+                if self.offline_policy == "latest":
+                    folded = fold_command(self.offline.pop(topic, None), payload)
+                    if folded is not None:
+                        self.offline[topic] = folded
+                    if len(self.offline) > self.offline_limit:
+                        self.offline.popitem(last=False)
+                        self.dropped_offline += 1
+                else:
+                    if len(self.offline) == self.offline.maxlen:
+                        self.dropped_offline += 1
+                    self.offline.append((topic, payload))
+
+    def set_connected(self, connected, detail=""):
+        """Called by ConnectionManager; going online flushes the offline queue"""
+        with self.cond:
+            self.connected = connected
+            if not connected:
+                return
+            if self.offline_policy == "latest":
+                backlog = list(self.offline.items())
+            else:
+                backlog = list(self.offline)
+            self.offline.clear()
+            # paho resends unacknowledged QoS >= 1 messages after CONNACK; QoS 0 ones are gone
+            self.inflight = {mid: entry for mid, entry in self.inflight.items() if entry[1] > 0}
+            self.early_acks.clear()
+
+        if backlog:
+            # Final state per topic, in the order the topics were first queued
+            folded = OrderedDict()
+            for topic, payload in backlog:
+                folded[topic] = fold_command(folded.get(topic), payload)
+            print(f"📤 Flushing {len(backlog)} queued MQTT command(s)")
+            self.publish_batched(list(folded.items()))
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        now = time.perf_counter()
+        with self.cond:
+            entry = self.inflight.pop(mid, None)
+            if entry is None:
+                self.early_acks[mid] = now
+            else:
+                self.latencies.append(now - entry[0])
+
+    def stats(self):
+        with self.cond:
+            latencies = np.array(self.latencies) * 1000
+            inflight = len(self.inflight)
+            offline = len(self.offline)
+        p50, p95 = np.percentile(latencies, [50, 95]) if len(latencies) else (0.0, 0.0)
+        return {
+            "requested": self.requested,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "unacked": inflight,
+            "queued_offline": self.queued_offline,
+            "dropped_offline": self.dropped_offline,
+            "offline_backlog": offline,
+            "ack_p50_ms": p50,
+            "ack_p95_ms": p95,
+        }
+
+    def stop(self, flush=True):
+        """Stop the flush thread, optionally publishing whatever is pending"""
+        self.running = False
+        with self.cond:
+            self.cond.notify()
+            leftovers = list(self.pending.items()) if flush else []
+            self.pending.clear()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.publish_batched([(topic, payload) for topic, (payload, _) in leftovers])
+
+
+# ===== Broker connection =====
+class ConnectionManager:
+    """Keeps the paho client connected without ever blocking the caller.
+
+    start() uses connect_async() and paho's own network thread, so
+    startup carries on while the broker is unreachable. After every
+    failed attempt or dropped connection the next retry delay doubles
+    from min_delay up to max_delay, with random jitter so several
+    stations do not hammer a restarted broker at the same moment.
+    Each listener is called as listener(connected, detail).
+    """
+
+    def __init__(self, client, host, port=1883, keepalive=60, min_delay=1.0, max_delay=60.0,
+                 listeners=()):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.listeners = list(listeners)
+
+        self.connected = False
+        self.stopping = False
+        self.failures = 0
+        self.reconnects = 0
+        self.next_delay = min_delay
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_connect_fail = self._on_connect_fail
+
+    def start(self):
+        self._schedule_retry()
+        self._notify(False, "connecting")
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+        return self
+
+    def _schedule_retry(self):
+        base = min(self.max_delay, self.min_delay * 2 ** min(self.failures, 16))
+        self.next_delay = base * random.uniform(0.5, 1.0)
+        # min == max, so paho waits exactly this long before the next attempt
+        self.client.reconnect_delay_set(min_delay=self.next_delay, max_delay=self.next_delay)
+
+    def _notify(self, connected, detail):
+        for listener in self.listeners:
+            try:
+                listener(connected, detail)
+            except Exception as e:
+                print(f"❌ MQTT listener error: {e}")
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code.is_failure:
+            self.failures += 1
+            self._schedule_retry()
+            self._notify(False, f"refused: {reason_code}")
+            return
+
+        if self.failures:
+            self.reconnects += 1
+        self.connected = True
+        self.failures = 0
+        self._schedule_retry()
+        self._notify(True, "connected")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        was_connected = self.connected
+        self.connected = False
+        if self.stopping:
+            return
+        self.failures += 1
+        self._schedule_retry()
+        if was_connected:
+            self._notify(False, f"lost ({reason_code}), retry in {self.next_delay:.1f}s")
+
+    def _on_connect_fail(self, client, userdata):
+        self.failures += 1
+        self._schedule_retry()
+        self._notify(False, f"unreachable, retry in {self.next_delay:.1f}s")
+
+    def stop(self):
+        self.stopping = True
+        self.client.disconnect()
+        self.client.loop_stop()
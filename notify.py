@@ -0,0 +1,302 @@
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+
+# ===== Durable alert journal =====
+class AlertStore:
+    """SQLite (WAL) journal of alerts that are not delivered yet.
+
+    Every alert is written here before the first network attempt and
+    deleted once Telegram accepts it, so a crash or reboot loses nothing.
+    Appends are grouped into one transaction (one fsync per batch), the
+    table is capped at max_entries and the WAL is truncated every
+    checkpoint_every acknowledgements. Only the outbox worker thread
+    uses it, never the video loop.
+    """
+
+    def __init__(self, path, max_entries=1000, checkpoint_every=20):
+        self.max_entries = max_entries
+        self.checkpoint_every = checkpoint_every
+        self.acks_since_checkpoint = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, text TEXT NOT NULL)")
+        self.conn.commit()
+
+    def append_many(self, alerts):
+        """Persist [(created, text), ...] in one transaction; returns the row ids"""
+        with self.conn:
+            ids = [self.conn.execute("INSERT INTO alerts (created, text) VALUES (?, ?)", alert).lastrowid
+                   for alert in alerts]
+            # Bounded size: the oldest alerts go first if something keeps failing
+            self.conn.execute(
+                "DELETE FROM alerts WHERE id NOT IN (SELECT id FROM alerts ORDER BY id DESC LIMIT ?)",
+                (self.max_entries,))
+        return ids
+
+    def pending(self):
+        return self.conn.execute("SELECT id, created, text FROM alerts ORDER BY id").fetchall()
+
+    def ack(self, row_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM alerts WHERE id = ?", (row_id,))
+        self.acks_since_checkpoint += 1
+        if self.acks_since_checkpoint >= self.checkpoint_every:
+            self.compact()
+
+    def compact(self):
+        """Fold the WAL back into the database file and truncate it"""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.acks_since_checkpoint = 0
+
+    def close(self):
+        self.compact()
+        self.conn.close()
+
+
+# ===== Telegram outbox =====
+class TelegramOutbox:
+    """Delivers Telegram messages from a worker thread.
+
+    send() only enqueues, so the gesture loop never waits on the
+    network. All requests share one keep-alive requests.Session, which
+    test_connection() warms up at startup. Failed sends are retried with
+    exponential backoff, and a 429 reply waits for Telegram's retry_after.
+    on_status(message_id, status, detail) is called with "sending",
+    "retrying", "sent" or "failed".
+    api_url can point at a local stand-in for the Bot API.
+    With an AlertStore, messages are journalled before sending and
+    anything left undelivered by a previous run is replayed on start().
+    Alerts that run out of max_attempts stay journalled and are replayed
+    again while running, replay_delay after the failure and doubling up
+    to max_replay_delay, so an outage longer than the retry budget only
+    delays them. A permanent 4xx rejection is logged and removed.
+    """
+
+    def __init__(self, token, chat_id, api_url="https://api.telegram.org", on_status=None,
+                 max_attempts=5, base_delay=1.0, max_delay=60.0, timeout=10, store=None,
+                 replay_delay=60.0, max_replay_delay=900.0):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_url = api_url.rstrip("/")
+        self.on_status = on_status
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.store = store
+        self.replay_delay = replay_delay
+        self.max_replay_delay = max_replay_delay
+
+        self.session = requests.Session()
+        self.queue = queue.Queue()
+        self.ids = itertools.count(1)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def url(self, method):
+        return f"{self.api_url}/bot{self.token}/{method}"
+
+    def test_connection(self):
+        """Call getMe over the pooled session; also opens the connection early"""
+        response = self.session.get(self.url("getMe"), timeout=self.timeout)
+        return response.status_code == 200
+
+    def start(self):
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        return self
+
+    def send(self, text):
+        """Queue a message and return its id immediately"""
+        message_id = next(self.ids)
+        self.queue.put((message_id, text, None))
+        return message_id
+
+    def _report(self, message_id, status, detail=""):
+        if self.on_status is not None:
+            try:
+                self.on_status(message_id, status, detail)
+            except Exception as e:
+                print(f"❌ Outbox status callback error: {e}")
+
+    def _replay(self):
+        for row_id, created, text in self.store.pending():
+            raised = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"📬 Replaying undelivered alert from {raised}")
+            self.queue.put((next(self.ids), f"{text}\n\n(delayed, raised at {raised})", row_id))
+
+    def _worker(self):
+        if self.store is not None:
+            self._replay()
+        replay_at = None
+        replay_delay = self.replay_delay
+
+        while not self.stop_event.is_set():
+            # Every earlier batch is finished here, so pending() only holds failed alerts
+            if replay_at is not None and time.monotonic() >= replay_at:
+                replay_at = None
+                self._replay()
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.store is not None:
+                new = [i for i, item in enumerate(batch) if item[2] is None]
+                if new:
+                    now = time.time()
+                    row_ids = self.store.append_many([(now, batch[i][1]) for i in new])
+                    for i, row_id in zip(new, row_ids):
+                        batch[i] = (batch[i][0], batch[i][1], row_id)
+
+            failed = False
+            for message_id, text, row_id in batch:
+                result = self.deliver(message_id, text)
+                if result == "sent":
+                    self.sent += 1
+                    if self.store is not None:
+                        self.store.ack(row_id)
+                elif result == "rejected":
+                    self.rejected += 1
+                    print(f"❌ Telegram rejected message #{message_id}, dropping it: {text[:40]!r}")
+                    if self.store is not None:
+                        self.store.ack(row_id)
+                else:
+                    # Stays in the journal and is replayed after replay_delay
+                    self.failed += 1
+                    failed = True
+
+            if self.store is not None and failed and not self.stop_event.is_set():
+                replay_at = time.monotonic() + replay_delay
+                replay_delay = min(self.max_replay_delay, replay_delay * 2)
+            elif not failed:
+                replay_delay = self.replay_delay
+
+    def deliver(self, message_id, text):
+        """Try to deliver one message with retries.
+
+        Returns "sent", "rejected" for a 4xx reply that retrying will not
+        fix, or "failed" once the attempts are used up.
+        """
+        data = {'chat_id': self.chat_id, 'text': text}
+        self._report(message_id, "sending")
+
+        for attempt in range(self.max_attempts):
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            try:
+                response = self.session.post(self.url("sendMessage"), data=data, timeout=self.timeout)
+                if response.status_code == 200:
+                    self._report(message_id, "sent")
+                    return "sent"
+
+                if response.status_code == 429:
+                    delay = self._retry_after(response, delay)
+                    detail = f"rate limited, retry in {delay:.0f}s"
+                elif 400 <= response.status_code < 500:
+                    # Bad token or chat id, retrying will not help
+                    self._report(message_id, "failed", f"HTTP {response.status_code}")
+                    return "rejected"
+                else:
+                    detail = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                detail = str(e)
+
+            if attempt + 1 < self.max_attempts:
+                self.retries += 1
+                self._report(message_id, "retrying", detail)
+                if self.stop_event.wait(delay):
+                    break
+
+        self._report(message_id, "failed", detail)
+        return "failed"
+
+    def _retry_after(self, response, default):
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return default
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.session.close()
+        if self.store is not None and (self.thread is None or not self.thread.is_alive()):
+            self.store.close()
+
+
+# ===== Local Bot API stand-in =====
+if __name__ == "__main__":
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FakeBotApi(BaseHTTPRequestHandler):
+        """Rate-limits the first sendMessage, then accepts everything"""
+        calls = 0
+
+        def do_GET(self):
+            self._reply(200, {"ok": True, "result": {"username": "fake_bot"}})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            FakeBotApi.calls += 1
+            if FakeBotApi.calls == 1:
+                self._reply(429, {"ok": False, "error_code": 429,
+                                  "parameters": {"retry_after": 1}})
+            else:
+                self._reply(200, {"ok": True, "result": {"message_id": FakeBotApi.calls}})
+
+        def _reply(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    delivered = threading.Event()
+
+    def show_status(message_id, status, detail):
+        print(f"📨 #{message_id} {status} {detail}")
+        if status in ("sent", "failed"):
+            delivered.set()
+
+    outbox = TelegramOutbox("TOKEN", "42", api_url=f"http://127.0.0.1:{server.server_port}",
+                            on_status=show_status).start()
+    print(f"getMe: {outbox.test_connection()}")
+    start = time.perf_counter()
+    outbox.send("🚨 EMERGENCY CALL 🚨")
+    print(f"send() returned after {(time.perf_counter() - start) * 1000:.2f} ms")
+    delivered.wait(10)
+    outbox.stop()
+    server.shutdown()
@@ -0,0 +1,185 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# ===== Batched landmark drawing =====
+# Same 21 connections as mp.solutions.hands.HAND_CONNECTIONS
+HAND_CONNECTIONS = np.array([
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+])
+
+
+def draw_hands(frame, points, line_color=(255, 255, 255), point_color=(0, 0, 255)):
+    """Draw a (N, 21, 2+) batch of pixel landmarks with two polylines calls"""
+    if len(points) == 0:
+        return
+    xy = points[..., :2].astype(np.int32)
+    cv2.polylines(frame, xy[:, HAND_CONNECTIONS].reshape(-1, 2, 2), False, line_color, 2)
+    # Single-point closed polylines come out as round dots
+    cv2.polylines(frame, xy.reshape(-1, 1, 2), True, point_color, 5)
+
+
+# ===== Cached static layer =====
+class StaticLayer:
+    """Overlay elements that never change, rendered once per resolution.
+
+    render(layer) draws onto a BGRA image starting from transparent
+    black. Each frame then gets the layer blended in with its alpha
+    mask, but only inside the row bands the layer actually covers.
+    """
+
+    def __init__(self, render):
+        self.render = render
+        self.cache = {}
+
+    def _build(self, h, w):
+        layer = np.zeros((h, w, 4), dtype=np.uint8)
+        self.render(layer)
+        alpha = layer[..., 3]
+        mask = alpha > 0
+        # Anti-aliased text is drawn over black, so the colours are premultiplied
+        bgr = np.ascontiguousarray(layer[..., :3])
+
+        regions = []
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows):
+            breaks = np.flatnonzero(np.diff(rows) > 1)
+            for y0, y1 in zip(np.r_[rows[0], rows[breaks + 1]], np.r_[rows[breaks], rows[-1]] + 1):
+                cols = np.flatnonzero(mask[y0:y1].any(axis=0))
+                x0, x1 = cols[0], cols[-1] + 1
+                band_alpha = alpha[y0:y1, x0:x1]
+                # Fully opaque bands (like the header bar) are a plain copy
+                if (band_alpha == 255).all():
+                    regions.append((y0, y1, x0, x1, None))
+                else:
+                    regions.append((y0, y1, x0, x1, (255 - band_alpha[..., None]).astype(np.uint16)))
+        return bgr, regions
+
+    def apply(self, frame):
+        h, w = frame.shape[:2]
+        entry = self.cache.get((h, w))
+        if entry is None:
+            entry = self.cache[(h, w)] = self._build(h, w)
+
+        bgr, regions = entry
+        for y0, y1, x0, x1, inv_alpha in regions:
+            if inv_alpha is None:
+                frame[y0:y1, x0:x1] = bgr[y0:y1, x0:x1]
+            else:
+                band = frame[y0:y1, x0:x1]
+                band[:] = bgr[y0:y1, x0:x1] + band * inv_alpha // 255
+
+
+# ===== Display thread =====
+class OverlayRenderer:
+    """Composites the latest frame and state snapshot on its own thread.
+
+    The main loop only calls submit(); drawing, cv2.imshow and
+    cv2.waitKey all happen here at no more than max_fps. Pressing Q in
+    the window sets quit_requested.
+    """
+
+    def __init__(self, draw, window_name="Gesture Control System", max_fps=15):
+        self.draw = draw
+        self.window_name = window_name
+        self.interval = 1.0 / max_fps
+        self.lock = threading.Lock()
+        self.frame = None
+        self.snapshot = None
+        self.frame_id = 0
+        self.quit_requested = threading.Event()
+        self.rendered_frames = 0
+        self.running = False
+        self.thread = None
+
+    def submit(self, frame, snapshot):
+        """Hand over a frame the caller will no longer modify"""
+        with self.lock:
+            self.frame = frame
+            self.snapshot = snapshot
+            self.frame_id += 1
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._render_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _render_loop(self):
+        shown_id = 0
+        while self.running:
+            start = time.perf_counter()
+
+            with self.lock:
+                frame, snapshot, frame_id = self.frame, self.snapshot, self.frame_id
+
+            if frame is not None and frame_id != shown_id:
+                shown_id = frame_id
+                try:
+                    self.draw(frame, snapshot)
+                    cv2.imshow(self.window_name, frame)
+                    self.rendered_frames += 1
+                except Exception as e:
+                    print(f"❌ Render error: {e}")
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                self.quit_requested.set()
+
+            elapsed = time.perf_counter() - start
+            if elapsed < self.interval:
+                time.sleep(self.interval - elapsed)
+
+        cv2.destroyAllWindows()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+
+# ===== Overlay benchmark =====
+if __name__ == "__main__":
+    import timeit
+
+    def draw_static(layer):
+        h, w = layer.shape[:2]
+        cv2.rectangle(layer, (0, 0), (w, 80), (0, 0, 0, 255), -1)
+        cv2.putText(layer, "Press 'Q' to quit", (w - 150, h - 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255, 255), 1, cv2.LINE_AA)
+
+    def overlay_before(frame, points):
+        # What mp_draw.draw_landmarks and the inline status bar do per frame
+        h, w = frame.shape[:2]
+        for hand in points:
+            for a, b in HAND_CONNECTIONS:
+                cv2.line(frame, (int(hand[a, 0]), int(hand[a, 1])),
+                         (int(hand[b, 0]), int(hand[b, 1])), (255, 255, 255), 2)
+            for x, y, _ in hand:
+                cv2.circle(frame, (int(x), int(y)), 2, (0, 0, 255), 2)
+        cv2.rectangle(frame, (0, 0), (w, 80), (0, 0, 0), -1)
+        cv2.putText(frame, "Press 'Q' to quit", (w - 150, h - 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+
+    static_layer = StaticLayer(draw_static)
+
+    def overlay_after(frame, points):
+        draw_hands(frame, points)
+        static_layer.apply(frame)
+
+    rng = np.random.default_rng(0)
+    frame = np.full((480, 640, 3), 90, dtype=np.uint8)
+    for hands in (1, 2):
+        points = (rng.random((hands, 21, 3)) * [400, 300, 1] + [100, 100, 0]).astype(np.float32)
+        runs = 2000
+        before = timeit.timeit(lambda: overlay_before(frame, points), number=runs) / runs
+        after = timeit.timeit(lambda: overlay_after(frame, points), number=runs) / runs
+        print(f"🖌️ {hands} hand(s): before {before * 1000:.3f} ms, "
+              f"after {after * 1000:.3f} ms per frame (x{before / after:.1f})")
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# DHT11 datasheet range; anything outside is a bad read
+DHT11_TEMP_RANGE = (0.0, 50.0)
+DHT11_HUMIDITY_RANGE = (5.0, 95.0)
+
+
+class DhtSampler:
+    """Reads the DHT11 on its own thread and caches the last good value.
+
+    read() is a single sensor attempt returning (humidity, temperature),
+    like Adafruit_DHT.read(); failures just wait for the next tick of the
+    fixed schedule instead of retrying in a tight loop. Readings outside
+    the sensor's range are dropped, the rest go through a median over
+    the last `window` samples (the DHT11 often returns one-off spikes)
+    and then an EMA. latest() never touches the GPIO, so the LCD, MQTT
+    or anything else can call it as often as it likes. Each listener is
+    called as listener(reading, fresh) after every attempt, from this
+    thread; fresh is False when the attempt failed and reading is the
+    older cached value.
+    """
+
+    def __init__(self, read, interval=3.0, window=5, alpha=0.3, listeners=()):
+        self.read = read
+        self.interval = interval
+        self.alpha = alpha
+        self.listeners = list(listeners)
+        self.temperatures = deque(maxlen=window)
+        self.humidities = deque(maxlen=window)
+
+        self.cached = None  # (temperature, humidity, monotonic time), replaced atomically
+        self.smoothed = None
+
+        self.reads = 0
+        self.failures = 0
+        self.glitches = 0
+        self.consecutive_failures = 0
+        self.last_error = ""
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def latest(self):
+        """(temperature, humidity, age in seconds), or None before the first good read"""
+        cached = self.cached
+        if cached is None:
+            return None
+        temperature, humidity, taken = cached
+        return temperature, humidity, time.monotonic() - taken
+
+    def _sample_loop(self):
+        next_run = time.monotonic()
+        while not self.stop_event.is_set():
+            fresh = self.sample()
+            reading = self.latest()
+            for listener in self.listeners:
+                try:
+                    listener(reading, fresh)
+                except Exception as e:
+                    print(f"❌ Sensor listener error: {e}")
+
+            # Fixed schedule: a slow read shortens the wait instead of shifting every later read
+            next_run += self.interval
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            self.stop_event.wait(next_run - now)
+
+    def sample(self):
+        """One read attempt; returns True if the cache was updated"""
+        self.reads += 1
+        try:
+            humidity, temperature = self.read()
+        except Exception as e:
+            return self._failed(str(e))
+        if humidity is None or temperature is None:
+            return self._failed("no data")
+
+        if not (DHT11_TEMP_RANGE[0] <= temperature <= DHT11_TEMP_RANGE[1]
+                and DHT11_HUMIDITY_RANGE[0] <= humidity <= DHT11_HUMIDITY_RANGE[1]):
+            self.glitches += 1
+            return self._failed(f"out of range ({temperature}C, {humidity}%)")
+
+        self.temperatures.append(temperature)
+        self.humidities.append(humidity)
+        median = (float(np.median(self.temperatures)), float(np.median(self.humidities)))
+        if self.smoothed is None:
+            self.smoothed = median
+        else:
+            self.smoothed = tuple(s + self.alpha * (m - s) for s, m in zip(self.smoothed, median))
+
+        self.cached = (self.smoothed[0], self.smoothed[1], time.monotonic())
+        self.consecutive_failures = 0
+        return True
+
+    def _failed(self, error):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        return False
+
+    def stats(self):
+        reading = self.latest()
+        return {
+            "reads": self.reads,
+            "failures": self.failures,
+            "glitches": self.glitches,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "age_s": reading[2] if reading is not None else None,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
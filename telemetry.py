@@ -0,0 +1,142 @@
+import numpy as np
+
+# Column layout of aggregate rows
+AGGREGATE_COLUMNS = ("time", "count", "temp", "temp_min", "temp_max", "hum", "hum_min", "hum_max")
+
+
+class RingSeries:
+    """Preallocated float64 rows; once full the oldest row is overwritten"""
+
+    def __init__(self, capacity, columns):
+        self.data = np.full((capacity, columns), np.nan)
+        self.pos = 0
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.pos] = row
+        self.pos = (self.pos + 1) % len(self.data)
+        if self.count < len(self.data):
+            self.count += 1
+
+    def rows(self):
+        """Copy of the stored rows, oldest first"""
+        if self.count < len(self.data):
+            return self.data[:self.count].copy()
+        return np.roll(self.data, -self.pos, axis=0)
+
+
+class _Accumulator:
+    """Running count/mean/min/max for one time bucket"""
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.start = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.t_sum = self.h_sum = 0.0
+        self.t_min = self.h_min = float("inf")
+        self.t_max = self.h_max = float("-inf")
+
+    def row(self):
+        return (self.start, self.count, self.t_sum / self.count, self.t_min, self.t_max,
+                self.h_sum / self.count, self.h_min, self.h_max)
+
+    def add(self, t, count, t_mean, t_min, t_max, h_mean, h_min, h_max):
+        """Merge a sample or a finer row; returns the previous bucket's row when it closes"""
+        closed = None
+        if self.seconds is not None:
+            bucket = t // self.seconds * self.seconds
+            if self.start is not None and bucket != self.start and self.count:
+                closed = self.row()
+                self.reset()
+            self.start = bucket
+        elif self.start is None:
+            self.start = t
+
+        self.count += count
+        self.t_sum += t_mean * count
+        self.h_sum += h_mean * count
+        self.t_min = min(self.t_min, t_min)
+        self.t_max = max(self.t_max, t_max)
+        self.h_min = min(self.h_min, h_min)
+        self.h_max = max(self.h_max, h_max)
+        return closed
+
+
+class ClimateHistory:
+    """Multi-resolution temperature/humidity history with fixed memory.
+
+    Raw readings are kept for raw_seconds, 1-minute aggregates for
+    minute_hours and 15-minute aggregates for quarter_days, each in its
+    own RingSeries allocated up front. add() is O(1): a reading updates
+    the open minute bucket, and every closed minute is folded into the
+    open quarter-hour bucket. take_summary() returns the aggregate since
+    the previous call, for one telemetry message per period.
+    """
+
+    def __init__(self, sample_interval=3.0, raw_seconds=3600, minute_hours=24, quarter_days=30):
+        self.raw = RingSeries(int(raw_seconds / sample_interval) + 1, 3)
+        self.minutes = RingSeries(minute_hours * 60, len(AGGREGATE_COLUMNS))
+        self.quarters = RingSeries(quarter_days * 96, len(AGGREGATE_COLUMNS))
+        self.minute_acc = _Accumulator(60)
+        self.quarter_acc = _Accumulator(900)
+        self.period_acc = _Accumulator()
+
+    def add(self, t, temperature, humidity):
+        """t is wall-clock time in seconds, so buckets line up with the clock"""
+        self.raw.append((t, temperature, humidity))
+        sample = (t, 1, temperature, temperature, temperature, humidity, humidity, humidity)
+        self.period_acc.add(*sample)
+
+        minute = self.minute_acc.add(*sample)
+        if minute is not None:
+            self.minutes.append(minute)
+            quarter = self.quarter_acc.add(*minute)
+            if quarter is not None:
+                self.quarters.append(quarter)
+
+    def take_summary(self):
+        """Aggregate since the last call as a dict, or None if nothing came in"""
+        acc = self.period_acc
+        if not acc.count:
+            return None
+        summary = {name: float(value) for name, value in zip(AGGREGATE_COLUMNS, acc.row())}
+        summary["count"] = int(summary["count"])
+        acc.reset()
+        acc.start = None
+        return summary
+
+    @property
+    def nbytes(self):
+        return self.raw.data.nbytes + self.minutes.data.nbytes + self.quarters.data.nbytes
+
+
+# ===== Long-run memory check =====
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    history = ClimateHistory(sample_interval=3.0)
+    rng = np.random.default_rng(0)
+    t0 = 1_700_000_000.0
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    for day in range(1, 43):
+        # One day at one reading every 3 s
+        times = t0 + (day - 1) * 86400 + np.arange(28800) * 3.0
+        temps = 22 + 3 * np.sin(times / 86400 * 2 * np.pi) + rng.normal(0, 0.2, len(times))
+        hums = 45 + rng.normal(0, 1, len(times))
+        for t, temperature, humidity in zip(times.tolist(), temps.tolist(), hums.tolist()):
+            history.add(t, temperature, humidity)
+        if day in (1, 7, 14, 42):
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"📈 Day {day}: {history.raw.count} raw, {history.minutes.count} minute, "
+                  f"{history.quarters.count} quarter rows, heap growth {current / 1024:.0f} KiB "
+                  f"(arrays {history.nbytes / 1024:.0f} KiB)")
+
+    elapsed = time.perf_counter() - start
+    print(f"⏱ {42 * 28800} readings in {elapsed:.1f} s ({elapsed / (42 * 28800) * 1e6:.1f} µs each)")
+    print(f"📦 Summary: {history.take_summary()}")
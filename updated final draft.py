@@ -1,166 +1,234 @@
 import cv2
 import mediapipe as mp
 import time
-import requests
 import paho.mqtt.client as mqtt
-import pyaudio
-import numpy as np
 import Adafruit_DHT as dht
 import threading
+import os
+import json
 from datetime import datetime
 from rpi_lcd import LCD
+from display import LcdRenderer, PRIORITY_ALERT, PRIORITY_LOG
+from sensors import DhtSampler
+from telemetry import ClimateHistory
+from camera import FrameGrabber
+from audio import AudioCapture, ChunkWorker, WavRecorder
+from claps import ClapDetector, NoiseFloor, RhythmMatcher, ClapPipeline
+from gestures import GesturePipeline
+from landmarks import LandmarkWriter
+from inference import RoiHands, QualityController, MotionGate
+from overlay import OverlayRenderer, StaticLayer, draw_hands
+from notify import TelegramOutbox, AlertStore
+from mqtt_control import CommandPipeline, ConnectionManager, DeviceRegistry
 
-lcd = LCD()
 DHT_SENSOR = dht.DHT11
 DHT_PIN = 14
 
-lcd_lock = threading.Lock()
-current_line1 = "Starting..."
-current_line2 = "Please wait"
-display_mode = "temp_hum"
-last_temp_update = 0
-temp_update_interval = 5
-log_display_start = 0
+temp_update_interval = 3
+DHT_MAX_AGE = 60
+TELE_PERIOD = 300
 log_display_duration = 8
+LCD_MIN_INTERVAL = 0.3
+
+lcd_display = LcdRenderer(LCD(), min_interval=LCD_MIN_INTERVAL, hold=log_display_duration)
+lcd_display.set_idle("Starting...", "Please wait")
 
 TELEGRAM_BOT_TOKEN = ""
 TELEGRAM_CHAT_ID = ""
+OUTBOX_PATH = "emergency_outbox.db"
 
 MQTT_BROKER = ""
 MQTT_PORT = 1883
-MQTT_TOPIC = ""
+MQTT_DEVICE = "tasmota_DEE65D"
 MQTT_USER = "DVES_USER"
 MQTT_PASS = "147"
+TELE_TOPIC = "tele/gesture_station/SENSOR"
+# action -> [(device topic, relay channel, command)]; add devices here to switch a whole scene
+MQTT_ACTIONS = {
+    "on": [(MQTT_DEVICE, 1, "ON")],
+    "off": [(MQTT_DEVICE, 1, "OFF")],
+    "fist": [(MQTT_DEVICE, 1, "TOGGLE")],
+    "double_clap": [(MQTT_DEVICE, 1, "TOGGLE")],
+}
+# topic -> QoS for everything the station publishes; a Backlog uses the QoS of its first POWER<n> topic
+MQTT_QOS = {
+    TELE_TOPIC: 0,  # periodic, the next summary replaces a lost one
+    f"cmnd/{MQTT_DEVICE}/POWER1": 1,  # relay commands must arrive
+}
+COMMAND_WINDOW = 0.08
+MQTT_OFFLINE_QUEUE = 20
 
 CHUNK = 512
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
 RATE = 16000
-THRESHOLD = 2500
+CLAP_MARGIN_DB = 12.0
+# Set to e.g. "kitchen.wav" to record the microphone plus detected events for clap_replay.py
+AUDIO_RECORD_PATH = None
 
 DOUBLE_CLAP_MIN_TIMEOUT = 1.0
 DOUBLE_CLAP_MAX_TIMEOUT = 1.5
-COOLDOWN = 2.0
+# pattern -> gaps between consecutive claps as (min, max) seconds
+CLAP_PATTERNS = {
+    "double_clap": [(DOUBLE_CLAP_MIN_TIMEOUT, DOUBLE_CLAP_MAX_TIMEOUT)],
+    "triple_clap": [(0.2, 0.7), (0.2, 0.7)],
+    "clap_pause_double": [(1.6, 2.5), (0.2, 0.7)],
+}
+# pattern -> "toggle", "off" or "emergency"
+CLAP_ACTIONS = {
+    "double_clap": "toggle",
+    "triple_clap": "off",
+    "clap_pause_double": "emergency",
+}
 call_cooldown = 300
 hold_time_needed = 2
 max_distance = 24
 light_cooldown = 1.0
+MAX_HANDS = 2
+USE_ROI = True
+TARGET_FPS = 15
+USE_IDLE_MODE = True
+IDLE_QUIET_PERIOD = 10.0
+HEADLESS = not os.environ.get("DISPLAY")
+DISPLAY_FPS = 15
+# Set to e.g. "session.landmarks" to dump the hands from every processed frame for landmarks.py
+LANDMARK_DUMP_PATH = None
 
-clap_times = []
 lights_on = False
+light_lock = threading.Lock()
 last_light_time = 0
-clap_timeout_timer = 0
 last_call_time = 0
-gesture_start_time = 0
 gesture_detected = False
-fist_start_time = 0
-fist_detected = False
+emergency_banner = None
+emergency_banner_until = 0
 
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.9)
-mp_draw = mp.solutions.drawing_utils
+hands_by_complexity = {
+    1: mp_hands.Hands(max_num_hands=MAX_HANDS, model_complexity=1, min_detection_confidence=0.9)
+}
+hands = hands_by_complexity[1]
+hand_detector = RoiHands(hands) if USE_ROI else hands
+quality = QualityController(target_fps=TARGET_FPS)
+motion_gate = MotionGate(quiet_period=IDLE_QUIET_PERIOD) if USE_IDLE_MODE else None
+gesture_pipeline = GesturePipeline(MAX_HANDS, max_distance, hold_time_needed)
+tracker = gesture_pipeline.tracker
+
+def set_model_complexity(complexity):
+    global hands, hand_detector
+
+    if complexity not in hands_by_complexity:
+        hands_by_complexity[complexity] = mp_hands.Hands(
+            max_num_hands=MAX_HANDS, model_complexity=complexity, min_detection_confidence=0.9)
+    hands = hands_by_complexity[complexity]
+
+    if USE_ROI:
+        hand_detector.hands = hands
+        hand_detector.roi = None
+    else:
+        hand_detector = hands
 
-def update_lcd_display():
-    global display_mode, last_temp_update, log_display_start
+def show_climate(reading, fresh):
+    # Called by the sampler after every read; only uses the cached value
+    if reading is None or reading[2] > DHT_MAX_AGE:
+        lcd_display.set_idle("DHT11 Error", "Check sensor")
+    else:
+        temperature, humidity, _ = reading
+        lcd_display.set_idle(f"Temp:{temperature:.1f}C", f"Hum:{humidity:.1f}%")
 
-    while True:
-        with lcd_lock:
-            current_time = time.time()
-
-            if display_mode == "temp_hum":
-                if current_time - last_temp_update >= temp_update_interval:
-                    try:
-                        humidity, temperature = dht.read_retry(DHT_SENSOR, DHT_PIN)
-                        if humidity is not None and temperature is not None:
-                            current_line1 = f"Temp:{temperature:.1f}C"
-                            current_line2 = f"Hum:{humidity:.1f}%"
-                            lcd.text(current_line1, 1)
-                            lcd.text(current_line2, 2)
-                            last_temp_update = current_time
-                        else:
-                            current_line1 = "DHT11 Error"
-                            current_line2 = "Check sensor"
-                            lcd.text(current_line1, 1)
-                            lcd.text(current_line2, 2)
-                    except Exception as e:
-                        current_line1 = "DHT11 Error"
-                        current_line2 = str(e)[:16]
-                        lcd.text(current_line1, 1)
-                        lcd.text(current_line2, 2)
-                        last_temp_update = current_time
-
-            elif display_mode == "log":
-                if current_time - log_display_start > log_display_duration:
-                    display_mode = "temp_hum"
-                    last_temp_update = 0
-                else:
-                    lcd.text(current_line1[:16], 1)
-                    lcd.text(current_line2[:16] if current_line2 else "", 2)
-
-        time.sleep(0.5)
-
-def show_log_on_lcd(line1, line2=""):
-    global display_mode, current_line1, current_line2, log_display_start
-
-    with lcd_lock:
-        current_line1 = line1
-        current_line2 = line2
-        display_mode = "log"
-        log_display_start = time.time()
-
-        lcd.text(current_line1[:16], 1)
-        lcd.text(current_line2[:16] if current_line2 else "", 2)
-
-lcd_thread = threading.Thread(target=update_lcd_display, daemon=True)
-lcd_thread.start()
+def show_log_on_lcd(line1, line2="", priority=PRIORITY_LOG):
+    lcd_display.post(line1, line2, priority)
+
+lcd_display.start()
+climate = DhtSampler(lambda: dht.read(DHT_SENSOR, DHT_PIN), interval=temp_update_interval,
+                     listeners=[show_climate]).start()
 
 show_log_on_lcd("System", "starting...")
 time.sleep(2)
 
+landmark_writer = None
 try:
-    cap = cv2.VideoCapture(0)
+    cap = FrameGrabber(0)
     if not cap.isOpened():
         print("❌ Camera not available")
         show_log_on_lcd("Camera", "not available")
+        cap.release()
         cap = None
     else:
+        cap.start()
         print("✅ Camera initialized")
         show_log_on_lcd("Camera", "initialized")
+        if LANDMARK_DUMP_PATH:
+            landmark_writer = LandmarkWriter(LANDMARK_DUMP_PATH, MAX_HANDS, TARGET_FPS)
+            print(f"⏺️ Dumping landmarks to {LANDMARK_DUMP_PATH}")
 except Exception as e:
     print(f"❌ Camera initialization failed: {e}")
     show_log_on_lcd("Camera", "init failed")
     cap = None
 
 mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-
-p = None
-stream = None
+commands = CommandPipeline(mqtt_client, window=COMMAND_WINDOW, qos_by_topic=MQTT_QOS,
+                           offline_limit=MQTT_OFFLINE_QUEUE, offline_policy="latest").start()
+devices = DeviceRegistry(MQTT_ACTIONS)
+for topic in sorted({topic for action in MQTT_ACTIONS for topic, _ in devices.commands(action)} - MQTT_QOS.keys()):
+    print(f"⚠️ {topic} has no entry in MQTT_QOS, using QoS {commands.default_qos}")
+
+climate_history = ClimateHistory(sample_interval=temp_update_interval)
+last_tele_time = time.time()
+
+def record_climate(reading, fresh):
+    # One summary per TELE_PERIOD, shaped like Tasmota's own tele/<topic>/SENSOR
+    global last_tele_time
+    now = time.time()
+    if fresh:
+        climate_history.add(now, reading[0], reading[1])
+
+    if now - last_tele_time < TELE_PERIOD:
+        return
+    last_tele_time = now
+    summary = climate_history.take_summary()
+    if summary is None:
+        return
+    payload = {
+        "Time": datetime.fromtimestamp(now).strftime("%Y-%m-%dT%H:%M:%S"),
+        "TelePeriod": TELE_PERIOD,
+        "DHT11": {
+            "Temperature": round(summary["temp"], 1),
+            "Humidity": round(summary["hum"], 1),
+            "TemperatureMin": round(summary["temp_min"], 1),
+            "TemperatureMax": round(summary["temp_max"], 1),
+            "HumidityMin": round(summary["hum_min"], 1),
+            "HumidityMax": round(summary["hum_max"], 1),
+            "Samples": summary["count"],
+        },
+        "TempUnit": "C",
+    }
+    commands.publish(TELE_TOPIC, json.dumps(payload))
+
+climate.listeners.append(record_climate)
+
+mic = None
 try:
-    p = pyaudio.PyAudio()
-    stream = p.open(
-        format=FORMAT,
-        channels=CHANNELS,
-        rate=RATE,
-        input=True,
-        frames_per_buffer=CHUNK,
-        input_device_index=3
-    )
+    mic = AudioCapture(rate=RATE, chunk=CHUNK, device_index=3).start()
     print("✅ Microphone initialized")
     show_log_on_lcd("Microphone", "initialized")
 except Exception as e:
     print(f"❌ Microphone initialization failed: {e}")
     show_log_on_lcd("Microphone", "init failed")
-    p = None
-    stream = None
+    mic = None
+
+def on_mqtt_state(connected, detail):
+    if connected:
+        print("✅ Connected to MQTT broker")
+        show_log_on_lcd("MQTT", "connected")
+    else:
+        print(f"⚠ MQTT {detail}")
+        show_log_on_lcd("MQTT", detail[:16])
+
+mqtt_link = ConnectionManager(mqtt_client, MQTT_BROKER, MQTT_PORT, 60,
+                              listeners=[commands.set_connected, on_mqtt_state])
 
 def connect_mqtt():
     try:
         mqtt_client.username_pw_set(MQTT_USER, MQTT_PASS)
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_start()
-        time.sleep(1)
-        print("✅ Connected to MQTT broker")
-        show_log_on_lcd("MQTT", "connected")
+        mqtt_link.start()
         return True
     except Exception as e:
         print(f"❌ MQTT connection error: {e}")
@@ -171,11 +239,11 @@ def control_light(state):
     global lights_on
     try:
         if state:
-            mqtt_client.publish(MQTT_TOPIC, "ON")
+            devices.run("on", commands)
             print("💡 Команда ON отправлена")
             show_log_on_lcd("Light", "ON")
         else:
-            mqtt_client.publish(MQTT_TOPIC, "OFF")
+            devices.run("off", commands)
             print("💡 Команда OFF отправлена")
             show_log_on_lcd("Light", "OFF")
 
@@ -186,10 +254,10 @@ def control_light(state):
         show_log_on_lcd("Light", "error")
         return False
 
-def toggle_light():
+def toggle_light(action="fist"):
     global lights_on
     try:
-        mqtt_client.publish(MQTT_TOPIC, "TOGGLE")
+        devices.run(action, commands)
         lights_on = not lights_on
         print(f"🔄 Light toggled to {'ON' if lights_on else 'OFF'}")
         show_log_on_lcd("Light", f"{'ON' if lights_on else 'OFF'}")
@@ -199,6 +267,31 @@ def toggle_light():
         show_log_on_lcd("Toggle", "error")
         return False
 
+def on_emergency_status(message_id, status, detail):
+    global emergency_banner, emergency_banner_until, last_call_time
+
+    if status == "sending":
+        print("📡 Sending emergency message...")
+        show_log_on_lcd("Sending", "emergency", PRIORITY_ALERT)
+    elif status == "retrying":
+        print(f"🔁 Emergency retry: {detail}")
+        show_log_on_lcd("Send retry", detail[:16], PRIORITY_ALERT)
+    elif status == "sent":
+        print("✅ Emergency call sent successfully!")
+        show_log_on_lcd("Emergency", "sent!", PRIORITY_ALERT)
+        emergency_banner = "sent"
+        emergency_banner_until = time.time() + 2
+    elif status == "failed":
+        print(f"❌ Failed to send emergency: {detail}")
+        show_log_on_lcd("Send", "failed", PRIORITY_ALERT)
+        emergency_banner = "error"
+        emergency_banner_until = time.time() + 2
+        # Let the user try again right away, as before
+        last_call_time = 0
+
+outbox = TelegramOutbox(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, on_status=on_emergency_status,
+                        store=AlertStore(OUTBOX_PATH))
+
 def send_emergency():
     global last_call_time
     current_time = time.time()
@@ -208,115 +301,131 @@ def send_emergency():
         show_log_on_lcd("Call", "cooldown")
         return False
 
-    try:
-        print("📡 Sending emergency message...")
-        show_log_on_lcd("Sending", "emergency")
+    last_call_time = current_time
+    outbox.send("🚨 EMERGENCY CALL 🚨\n\nUser needs help! Please check immediately.")
+    return True
 
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {
-            'chat_id': TELEGRAM_CHAT_ID,
-            'text': "🚨 EMERGENCY CALL 🚨\n\nUser needs help! Please check immediately."
-        }
+noise_floor = NoiseFloor(margin_db=CLAP_MARGIN_DB)
+clap_detector = ClapDetector(rate=RATE, noise_floor=noise_floor)
+clap_rhythm = RhythmMatcher(CLAP_PATTERNS)
+clap_pipeline = None
+audio_recorder = None
+reported_threshold = None
 
-        response = requests.post(url, data=data, timeout=10)
+def run_clap_pattern(pattern, clap_time):
+    global last_light_time
 
-        if response.status_code == 200:
-            last_call_time = current_time
-            print("✅ Emergency call sent successfully!")
-            show_log_on_lcd("Emergency", "sent!")
-            return True
-        else:
-            print(f"❌ Failed to send. Status: {response.status_code}")
-            show_log_on_lcd("Send", "failed")
-            return False
+    action = CLAP_ACTIONS.get(pattern)
+    print(f"🥁 Clap pattern: {pattern} -> {action}")
 
-    except Exception as e:
-        print(f"❌ Error sending message: {e}")
-        show_log_on_lcd("Send", "error")
-        return False
+    if action == "emergency":
+        send_emergency()
+        return
 
-def is_finger_extended(pip, dip, tip):
-    return tip[1] < pip[1] and tip[1] < dip[1]
+    with light_lock:
+        if clap_time - last_light_time <= light_cooldown:
+            return
+        if action == "toggle":
+            toggle_light(pattern)
+        elif action == "off":
+            control_light(False)
+        last_light_time = clap_time
 
-def detect_gesture(landmarks, h, w):
-    lm = [(int(p.x * w), int(p.y * h)) for p in landmarks.landmark]
+def process_audio_chunk(audio_data, sample_index):
+    global reported_threshold
 
-    fingers = []
-    fingers.append(1 if lm[4][0] > lm[3][0] else 0)
-    for tip in [8, 12, 16, 20]:
-        fingers.append(1 if lm[tip][1] < lm[tip - 2][1] else 0)
+    try:
+        if audio_recorder:
+            audio_recorder.write(audio_data, sample_index)
 
-    if sum(fingers) == 0:
-        return "fist"
-    elif sum(fingers) == 5:
-        return "palm"
-    else:
-        return "other"
+        claps, patterns = clap_pipeline.process(audio_data, sample_index)
 
-def is_clap(audio_data):
-    volume = np.max(np.abs(audio_data))
-    return volume > THRESHOLD, volume
+        threshold = noise_floor.threshold_db
+        if reported_threshold is None or abs(threshold - reported_threshold) >= 3:
+            print(f"🎚️ Noise floor {noise_floor.floor_db:.0f} dBFS, "
+                  f"clap threshold {threshold:.0f} dBFS (+{noise_floor.margin_db:.0f} dB)")
+            reported_threshold = threshold
 
-def process_audio_fast():
-    global clap_times, lights_on, last_light_time, clap_timeout_timer
+        for index, clap_time, level_db, gap in claps:
+            print(f"👏 Clap! Level: {level_db:.0f} dBFS")
+            show_log_on_lcd("Clap", "detected")
+            if gap is not None:
+                print(f"📊 Interval: {gap:.3f}s")
+            if audio_recorder:
+                audio_recorder.event("clap", index, level_db=round(level_db, 1))
 
-    if stream is None:
-        return
+        for pattern, pattern_time in patterns:
+            if audio_recorder:
+                audio_recorder.event("pattern", clap_pipeline.next_index, name=pattern)
+            run_clap_pattern(pattern, pattern_time)
 
-    try:
-        data = stream.read(CHUNK, exception_on_overflow=False)
-        audio_data = np.frombuffer(data, dtype=np.int16)
-        current_time = time.time()
+    except Exception as e:
+        print(f"❌ Audio processing error: {e}")
 
-        detected, volume = is_clap(audio_data)
+def draw_static_overlay(layer):
+    h, w, _ = layer.shape
 
-        if detected and volume > THRESHOLD:
-            print(f"👏 Clap! Volume: {volume}")
-            show_log_on_lcd("Clap", "detected")
+    cv2.rectangle(layer, (0, 0), (w, 80), (0, 0, 0, 255), -1)
 
-            clap_times.append(current_time)
+    cv2.putText(layer, "Press 'Q' to quit",
+                (w - 150, h - 40), cv2.FONT_HERSHEY_SIMPLEX,
+                0.5, (255, 255, 255, 255), 1, cv2.LINE_AA)
 
-            if len(clap_times) > 2:
-                clap_times = clap_times[-2:]
+static_overlay = StaticLayer(draw_static_overlay)
 
-            clap_timeout_timer = current_time
+def draw_overlay(frame, snapshot):
+    h, w, _ = frame.shape
 
-            if len(clap_times) == 2:
-                interval = clap_times[1] - clap_times[0]
-                print(f"📊 Interval: {interval:.3f}s")
+    draw_hands(frame, snapshot["hands"])
 
-                if DOUBLE_CLAP_MIN_TIMEOUT <= interval <= DOUBLE_CLAP_MAX_TIMEOUT:
-                    if current_time - last_light_time > light_cooldown:
-                        toggle_light()
-                        last_light_time = current_time
-                        clap_times = []
-                        clap_timeout_timer = 0
-                else:
-                    print(f"❌ Invalid interval: {interval:.3f}s")
-                    show_log_on_lcd("Clap", "bad interval")
-                    clap_times = [clap_times[1]]
+    if snapshot["emergency"] == "sent":
+        cv2.putText(frame, "EMERGENCY SENT!",
+                    (w // 2 - 120, h - 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    elif snapshot["emergency"] == "sending":
+        cv2.putText(frame, "SENDING...",
+                    (w // 2 - 120, h - 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    elif snapshot["emergency"] == "error":
+        cv2.putText(frame, "SEND ERROR!",
+                    (w // 2 - 120, h - 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    elif snapshot["time_left"] is not None:
+        cv2.putText(frame, f"EMERGENCY: {snapshot['time_left']:.1f}s",
+                    (w // 2 - 150, h - 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        if clap_timeout_timer > 0 and (current_time - clap_timeout_timer) > COOLDOWN:
-            print("🔄 Clap timer reset")
-            clap_times = []
-            clap_timeout_timer = 0
+    static_overlay.apply(frame)
 
-    except Exception as e:
-        print(f"❌ Audio processing error: {e}")
+    cv2.putText(frame, f"STATUS: {snapshot['status']}", (10, 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    lights = snapshot["lights_on"]
+    cv2.putText(frame, f"Light: {'ON' if lights else 'OFF'}", (w - 150, 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                (0, 255, 0) if lights else (0, 0, 255), 1)
+
+    cv2.putText(frame, f"Claps: {snapshot['claps']}", (10, 45),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+
+    cv2.putText(frame, f"Quality: {snapshot['quality']}", (10, 70),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+
+    cv2.putText(frame, f"Gesture: {snapshot['gesture'].upper()}",
+                (10, h - 40), cv2.FONT_HERSHEY_SIMPLEX,
+                0.5, (200, 200, 200), 1)
 
 def test_telegram_connection():
     print("🔍 Testing Telegram...")
     show_log_on_lcd("Testing", "Telegram")
 
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getMe"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
+        if outbox.test_connection():
             print("✅ Telegram bot is working!")
             show_log_on_lcd("Telegram", "OK")
             return True
         else:
-            print(f"❌ Bot test failed: {response.status_code}")
+            print("❌ Bot test failed")
             show_log_on_lcd("Telegram", "failed")
             return False
     except Exception as e:
@@ -326,7 +435,17 @@ def test_telegram_connection():
 
 connect_mqtt()
 time.sleep(1)
+
+audio_worker = None
+if mic is not None:
+    clap_pipeline = ClapPipeline(clap_detector, clap_rhythm, mic.clock.to_wall)
+    if AUDIO_RECORD_PATH:
+        audio_recorder = WavRecorder(AUDIO_RECORD_PATH, RATE)
+        print(f"⏺️ Recording audio to {AUDIO_RECORD_PATH}")
+    audio_worker = ChunkWorker(mic.ring, CHUNK, process_audio_chunk).start()
+
 test_telegram_connection()
+outbox.start()
 time.sleep(1)
 
 print("\n🚀 System started!")
@@ -338,138 +457,101 @@ print("  - Fist: toggle light")
 print("  - OK (hold 2 sec): emergency call")
 print("Claps:")
 print("  - Double clap (1.0-1.5s): toggle light")
-print("Press 'Q' to quit\n")
+print("  - Triple clap (fast): light off")
+print("  - Clap, pause, clap clap: emergency call")
+print("Press 'Q' to quit\n" if not HEADLESS else "Headless mode, press Ctrl+C to quit\n")
+
+renderer = None
+if not HEADLESS:
+    renderer = OverlayRenderer(draw_overlay, max_fps=DISPLAY_FPS).start()
 
 try:
     while True:
-        process_audio_fast()
-
         if cap is not None:
-            success, frame = cap.read()
-            if success:
+            success, frame, frame_time = cap.read(timeout=0.05)
+            if success and quality.should_process():
+                frame_start = time.perf_counter()
+                settings = quality.settings
+
                 frame = cv2.flip(frame, 1)
                 h, w, _ = frame.shape
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = hands.process(rgb)
-
-                ok_gesture = False
-                fist_gesture = False
-                current_gesture = "none"
-
-                if results.multi_hand_landmarks:
-                    for hand_landmarks in results.multi_hand_landmarks:
-                        mp_draw.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-
-                        points = []
-                        for point in hand_landmarks.landmark:
-                            x = int(point.x * w)
-                            y = int(point.y * h)
-                            points.append((x, y))
-
-                        thumb_tip = points[4]
-                        index_tip = points[8]
-                        middle_tip = points[12]
-                        ring_tip = points[16]
-                        pinky_tip = points[20]
-
-                        middle_pip = points[10]
-                        middle_dip = points[11]
-                        ring_pip = points[14]
-                        ring_dip = points[15]
-                        pinky_pip = points[18]
-                        pinky_dip = points[19]
-
-                        dx = thumb_tip[0] - index_tip[0]
-                        dy = thumb_tip[1] - index_tip[1]
-                        distance = (dx * dx + dy * dy) ** 0.5
-
-                        middle_up = middle_tip[1] < middle_pip[1] and middle_tip[1] < middle_dip[1]
-                        ring_up = ring_tip[1] < ring_pip[1] and ring_tip[1] < ring_dip[1]
-                        pinky_up = pinky_tip[1] < pinky_pip[1] and pinky_tip[1] < pinky_dip[1]
-
-                        if distance < max_distance and middle_up and ring_up and pinky_up:
-                            ok_gesture = True
-
-                        current_gesture = detect_gesture(hand_landmarks, h, w)
-                        if current_gesture == "fist":
-                            fist_gesture = True
-
-                current_time = time.time()
-
-                if ok_gesture:
-                    if not gesture_detected:
-                        gesture_detected = True
-                        gesture_start_time = current_time
-                        print("👌 OK gesture detected")
-                        show_log_on_lcd("OK gesture", "hold 2 sec")
-
-                    hold_time = current_time - gesture_start_time
-                    time_left = hold_time_needed - hold_time
-
-                    if time_left > 0:
-                        cv2.putText(frame, f"EMERGENCY: {time_left:.1f}s",
-                                    (w // 2 - 150, h - 100),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                current_time = frame_time
+                hand_list = []
+                results = None
+
+                awake = motion_gate is None or motion_gate.check(frame, current_time)
+                if awake:
+                    if settings["scale"] < 1.0:
+                        small = cv2.resize(frame, None, fx=settings["scale"], fy=settings["scale"],
+                                           interpolation=cv2.INTER_AREA)
                     else:
+                        small = frame
+                    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+                    inference_start = time.perf_counter()
+                    results = hand_detector.process(rgb)
+                    hand_list = results.multi_hand_landmarks or []
+                    if motion_gate is not None:
+                        motion_gate.record_inference(time.perf_counter() - inference_start)
+                        if hand_list:
+                            motion_gate.activity(current_time)
+
+                events, time_left, hand_ids = gesture_pipeline.step(hand_list, w, h, current_time)
+                if landmark_writer:
+                    landmark_writer.write(current_time, results, w, h)
+
+                emergency_result = None
+                for event, hand_id in events:
+                    if event == "ok_start":
+                        print(f"👌 OK gesture detected (hand {hand_id})")
+                        show_log_on_lcd("OK gesture", "hold 2 sec")
+                    elif event == "emergency":
                         print("🆘 Sending emergency...")
-                        if send_emergency():
-                            cv2.putText(frame, "EMERGENCY SENT!",
-                                        (w // 2 - 120, h - 100),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        else:
-                            cv2.putText(frame, "SEND ERROR!",
-                                        (w // 2 - 120, h - 100),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-                        gesture_detected = False
-                else:
-                    gesture_detected = False
-
-                if fist_gesture:
-                    current_time = time.time()
-                    if not fist_detected:
-                        fist_detected = True
-                        fist_start_time = current_time
-                        print("✊ Fist detected!")
+                        emergency_result = send_emergency()
+                    elif event == "fist":
+                        print(f"✊ Fist detected! (hand {hand_id})")
                         show_log_on_lcd("Fist", "detected")
 
-                        if current_time - last_light_time > light_cooldown:
-                            toggle_light()
-                            last_light_time = current_time
-                else:
-                    fist_detected = False
-
-                cv2.rectangle(frame, (0, 0), (w, 80), (0, 0, 0), -1)
+                        with light_lock:
+                            if current_time - last_light_time > light_cooldown:
+                                toggle_light("fist")
+                                last_light_time = current_time
 
-                status = "READY" if not gesture_detected else "HOLDING OK"
-                cv2.putText(frame, f"STATUS: {status}", (10, 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                gesture_detected = any(state.ok_active for state in tracker.states.values())
 
-                light_status = f"Light: {'ON' if lights_on else 'OFF'}"
-                cv2.putText(frame, light_status, (w - 150, 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                            (0, 255, 0) if lights_on else (0, 0, 255), 1)
+                if emergency_result:
+                    emergency_banner = "sending"
+                    emergency_banner_until = current_time + 2
 
-                clap_info = f"Claps: {len(clap_times)}/2"
-                cv2.putText(frame, clap_info, (10, 45),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-
-                cv2.putText(frame, f"Gesture: {current_gesture.upper()}",
-                            (10, h - 40), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, (200, 200, 200), 1)
-
-                cv2.putText(frame, "Press 'Q' to quit",
-                            (w - 150, h - 40), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, (255, 255, 255), 1)
-
-                cv2.imshow("Gesture Control System", frame)
-
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
+                if renderer is not None:
+                    if not awake:
+                        status = "IDLE"
+                    else:
+                        status = "READY" if not gesture_detected else "HOLDING OK"
+
+                    renderer.submit(frame, {
+                        "hands": gesture_pipeline.points[:gesture_pipeline.count].copy(),
+                        "status": status,
+                        "lights_on": lights_on,
+                        "claps": clap_rhythm.progress,
+                        "quality": f"{quality.level} {settings['name']}",
+                        "gesture": " ".join(
+                            f"{hand_id}:{tracker.states[hand_id].gesture}" for hand_id in hand_ids) or "none",
+                        "time_left": time_left,
+                        "emergency": emergency_banner if current_time < emergency_banner_until else None,
+                    })
+
+                if awake and quality.record(time.perf_counter() - frame_start):
+                    settings = quality.settings
+                    print(f"⚙️ Quality level {quality.level}: {settings['name']} "
+                          f"({quality.avg_cost * 1000:.0f} ms/frame, budget {quality.budget * 1000:.0f} ms)")
+                    set_model_complexity(settings["complexity"])
+
+        if renderer is not None and renderer.quit_requested.is_set():
             show_log_on_lcd("System", "stopped")
             break
 
-        time.sleep(0.01)
+        if cap is None:
+            time.sleep(0.01)
 
 except KeyboardInterrupt:
     print("\n🛑 Stopped by user")
@@ -485,18 +567,59 @@ finally:
     time.sleep(2)
 
     if cap:
+        stats = cap.stats()
+        print(f"📷 Frames: {stats['captured']} captured, "
+              f"{stats['dropped']} dropped, {stats['stale_reads']} stale reads")
         cap.release()
-    cv2.destroyAllWindows()
-
-    if stream:
-        stream.stop_stream()
-        stream.close()
-    if p:
-        p.terminate()
-
-    with lcd_lock:
-        lcd.clear()
 
-    mqtt_client.loop_stop()
-    mqtt_client.disconnect()
+    if renderer is not None:
+        renderer.stop()
+
+    if motion_gate is not None:
+        stats = motion_gate.stats()
+        print(f"💤 Idle: {stats['idle_frames']} frames, ~{stats['saved_s']:.1f}s CPU saved "
+              f"({stats['gate_s']:.1f}s spent on motion checks), {stats['wake_ups']} wake-ups, "
+              f"avg wake-up latency {stats['wake_latency_ms']:.0f} ms")
+
+    if USE_ROI:
+        stats = hand_detector.stats()
+        print(f"✂️ ROI tracking: {stats['roi_frames']} frames at {stats['roi_ms']:.1f} ms, "
+              f"full-frame passes: {stats['full_frames']} at {stats['full_ms']:.1f} ms, "
+              f"{stats['lost_tracks']} lost tracks")
+
+    if landmark_writer:
+        landmark_writer.close()
+        print(f"🖐 {landmark_writer.frames} frames of landmarks in {LANDMARK_DUMP_PATH}")
+
+    if audio_worker:
+        audio_worker.stop()
+    if audio_recorder:
+        audio_recorder.close()
+    if mic:
+        if mic.ring.lost_samples or mic.overflows:
+            print(f"🎤 Audio: {mic.ring.lost_samples} samples lost, "
+                  f"{mic.overflows} input overflows")
+        mic.stop()
+
+    climate.stop()
+    stats = climate.stats()
+    print(f"🌡️ DHT11: {stats['reads']} reads, {stats['failures']} failed "
+          f"({stats['glitches']} out of range)")
+
+    lcd_display.stop()
+    stats = lcd_display.stats()
+    print(f"📟 LCD: {stats['posted']} messages ({stats['coalesced']} coalesced), "
+          f"{stats['chars_written']}/{stats['chars_full']} characters written")
+
+    outbox.stop()
+
+    commands.stop()
+    stats = commands.stats()
+    print(f"📨 MQTT: {stats['requested']} commands, {stats['published']} published "
+          f"({stats['coalesced']} coalesced, {stats['errors']} errors), "
+          f"PUBACK p50 {stats['ack_p50_ms']:.0f} ms / p95 {stats['ack_p95_ms']:.0f} ms, "
+          f"{stats['queued_offline']} queued offline, {stats['dropped_offline']} dropped, "
+          f"{mqtt_link.reconnects} reconnects")
+
+    mqtt_link.stop()
     print("✅ System stopped cleanly")